@@ -0,0 +1,197 @@
+# !/usr/bin/env python
+from perceptron import *
+import time
+
+
+class BudgetExceeded(Exception):
+    """raised from the arc scores of an MST decoding whose deadline has passed"""
+    pass
+
+
+def greedy_tree(scores):
+    """
+    best head of every node, repaired into a tree
+    nodes cut off from ROOT (cycles and their subtrees) are attached to the tree one at a time, by the arc
+    losing the least score against the node's best head
+    :return: parents dictionary
+    """
+    node_num = len(scores)
+    masked = scores.astype(np.float64)
+    masked[:, 0] = -np.inf
+    masked[np.arange(node_num), np.arange(node_num)] = -np.inf
+    heads = masked.argmax(axis=0)
+    heads[0] = 0
+    best = masked[heads, np.arange(node_num)]
+    while True:
+        # nodes reaching ROOT through their heads
+        attached = np.zeros(node_num, dtype=bool)
+        attached[0] = True
+        for m in range(1, node_num):
+            path = []
+            h = m
+            while not attached[h] and h not in path:
+                path.append(h)
+                h = heads[h]
+            if attached[h]:
+                attached[path] = True
+        detached = np.flatnonzero(~attached)
+        if not len(detached):
+            return {m: int(heads[m]) for m in range(1, node_num)}
+        loss = best[detached] - masked[np.flatnonzero(attached)][:, detached]
+        h, m = np.unravel_index(loss.argmin(), loss.shape)
+        heads[detached[m]] = np.flatnonzero(attached)[h]
+
+
+class BudgetedDigraph(Digraph):
+    """Digraph whose arc scores raise BudgetExceeded once the deadline passes, in every contracted graph too"""
+
+    def __init__(self, successors, get_score, deadline, node_id=None):
+        """:param deadline: time.perf_counter() time to stop at"""
+        def score(h, m):
+            if time.perf_counter() > deadline:
+                raise BudgetExceeded()
+            return get_score(h, m)
+
+        super(BudgetedDigraph, self).__init__(successors, score, node_id=node_id)
+        self._deadline = deadline
+
+    def contract(self, cycle):
+        """contract a cycle, the contracted graph keeps the deadline"""
+        new_id, old_edges, compact = super(BudgetedDigraph, self).contract(cycle)
+        return new_id, old_edges, BudgetedDigraph(compact.successors, compact.get_score, self._deadline,
+                                                  compact.new_node_id)
+
+
+def budgeted_mst(scores, deadline=None):
+    """
+    decode arc scores matrix into the maximum spanning tree, unless the deadline passes first
+    :param deadline: time.perf_counter() time to stop the MST decoding at, None to never stop
+    :return: parents dictionary, True if the deadline passed and the greedy tree was returned
+    """
+    if deadline is None:
+        return mst_decode(scores), False
+    rows = scores.tolist()
+    try:
+        return tree_2_parent(BudgetedDigraph(full_graph(len(rows)), lambda h, m: rows[h][m],
+                                             deadline).mst().successors), False
+    except BudgetExceeded:
+        return greedy_tree(scores), True
+
+
+def budgeted_shifts(sentence, features, deadline):
+    """
+    sentence_shifts, the deadline is checked before the arcs of every head are extracted
+    :return: shifts array, None if the deadline passed first
+    """
+    heads, mods = arcs(sentence.sentence_len)
+    shifts = []
+    for arc, (h, m) in enumerate(zip(heads.tolist(), mods.tolist())):
+        if arc % (sentence.sentence_len - 1) == 0 and time.perf_counter() > deadline:
+            return None
+        shifts.append([shift for shift, _ in features(h, m, sentence)])
+    return np.array(shifts, dtype=np.int32).reshape(len(heads), -1)
+
+
+def chain_decode(w, sentence, features, labeler=None):
+    """
+    cheapest degraded parse, for a sentence whose deadline passed before its features were extracted
+    every word is attached to the word before it (the first word to ROOT), only the relations of these arcs are scored
+    :return: parents dictionary, relation index dictionary (None without labeler), True
+    """
+    parents = {m: m - 1 for m in range(1, sentence.sentence_len)}
+    if labeler is None or not parents:
+        return parents, None if labeler is None else dict(), True
+    mods = list(parents)
+    rows = arc_rows(sentence.sentence_len)[[parents[m] for m in mods], mods]
+    shifts = np.array([[shift for shift, _ in features(parents[m], m, sentence)] for m in mods], dtype=np.int32)
+    relations = labeler.relation_scores(w, shifts, sentence.sentence_len, rows).argmax(axis=1)
+    return parents, {m: int(relation) for m, relation in zip(mods, relations)}, True
+
+
+def budgeted_decode(w, shifts, layout, sentence_len, labeler=None, deadline=None):
+    """
+    labeled_decode with a deadline, see budgeted_mst
+    :return: parents dictionary, relation index dictionary (None without labeler), True if degraded
+    """
+    scores = scores_matrix(w, shifts, layout, sentence_len)
+    if labeler is None:
+        parents, degraded = budgeted_mst(scores, deadline)
+        return parents, None, degraded
+    best_scores, best_relations = labeler.best_relations(w, shifts, sentence_len)
+    parents, degraded = budgeted_mst(scores + best_scores, deadline)
+    return parents, {m: int(best_relations[h, m]) for m, h in parents.items()}, degraded
+
+
+def budgeted_sentence_decode(w, sentence, features, layout, labeler=None, deadline=None):
+    """
+    extract and decode a sentence against a deadline, extraction stops at the deadline, see budgeted_shifts
+    :return: parents dictionary, relation index dictionary (None without labeler), True if degraded
+    """
+    if deadline is None:
+        return budgeted_decode(w, sentence_shifts(sentence, features), layout, sentence.sentence_len, labeler)
+    shifts = budgeted_shifts(sentence, features, deadline) if time.perf_counter() <= deadline else None
+    if shifts is None:
+        return chain_decode(w, sentence, features, labeler)
+    return budgeted_decode(w, shifts, layout, sentence.sentence_len, labeler, deadline)
+
+
+if __name__ == '__main__':
+    from features import *
+
+    def is_tree(parents, node_num):
+        if sorted(parents) != list(range(1, node_num)):
+            return False
+        for m in parents:
+            h, seen = m, set()
+            while h != 0:
+                if h in seen:
+                    return False
+                seen.add(h)
+                h = parents[h]
+        return True
+
+    # validate cycles of the greedy heads are repaired into a tree
+    scores = np.zeros((5, 5), dtype=int)
+    scores[0, 1] = 5
+    scores[2, 3], scores[3, 2] = 10, 9
+    scores[4, 3] = 1
+    scores[3, 4] = 8
+    scores[1, 2], scores[1, 3] = 4, 2
+    parents = greedy_tree(scores)
+    assert is_tree(parents, 5) and parents == {1: 0, 2: 1, 3: 2, 4: 3}
+    random_state = np.random.RandomState(0)
+    for _ in range(20):
+        assert is_tree(greedy_tree(random_state.randint(-9, 9, (12, 12))), 12)
+
+    # validate decoding within and over the budget
+    vocab_list = ['ofir', 'tomer', 'nadav', 'roy']
+    pos_list = ['S', 'T']
+    word_pos_pairs = [('ofir', 'S'), ('tomer', 'S'), ('nadav', 'T'), ('roy', 'T')]
+    complex = ComplexFeatures(vocab_list, pos_list, word_pos_pairs)
+    labeler = Labeler(['NMOD', 'P', 'ROOT'], window_list(complex))
+    w = random_state.randint(-5, 5, complex.features_len() + labeler.weights_len())
+    layout = DenseLayout(window_list(complex))
+    sentence = Sentence(['ofir', 'roy', 'tomer', 'nadav', 'roy', 'ofir'], ['S', 'T', 'S', 'T', 'T', 'S'])
+    shifts = sentence_shifts(sentence, complex)
+    expected = labeled_decode(w, shifts, layout, sentence.sentence_len, labeler)
+    assert budgeted_decode(w, shifts, layout, sentence.sentence_len, labeler) == expected + (False,)
+    assert budgeted_decode(w, shifts, layout, sentence.sentence_len, labeler,
+                           time.perf_counter() + 60) == expected + (False,)
+    parents, relation_ids, degraded = budgeted_decode(w, shifts, layout, sentence.sentence_len, labeler,
+                                                      time.perf_counter())
+    assert degraded and is_tree(parents, sentence.sentence_len) and sorted(relation_ids) == sorted(parents)
+    assert budgeted_decode(w, shifts, layout, sentence.sentence_len, deadline=time.perf_counter())[1:] == (None, True)
+
+    # validate lazy extraction and the chain fallback
+    assert (budgeted_shifts(sentence, complex, time.perf_counter() + 60) == shifts).all()
+    assert budgeted_shifts(sentence, complex, time.perf_counter()) is None
+    parents, relation_ids, degraded = chain_decode(w, sentence, complex, labeler)
+    assert degraded and parents == {m: m - 1 for m in range(1, 7)} and sorted(relation_ids) == sorted(parents)
+    assert relation_ids[3] == labeler.best_relations(w, shifts, sentence.sentence_len)[1][2, 3]
+    assert chain_decode(w, sentence, complex)[1:] == (None, True)
+    assert budgeted_sentence_decode(w, sentence, complex, layout, labeler, time.perf_counter() + 60) == \
+        expected + (False,)
+    assert budgeted_sentence_decode(w, sentence, complex, layout, labeler, time.perf_counter()) == \
+        chain_decode(w, sentence, complex, labeler)
+
+    print('PASSED!')
@@ -0,0 +1,56 @@
+# !/usr/bin/env python
+from segmented_benchmark import *
+import argparse
+import time
+
+
+def fallback_rate(parses):
+    """return fraction of degraded parses"""
+    return sum(1 for parse in parses if parse.degraded) / len(parses)
+
+
+def timed_batches(parser, sentences, batch_size, budget):
+    """parse sentences in batches under a batch budget, return parses and batch latencies (seconds) lists"""
+    parses = []
+    latencies = []
+    for start in range(0, len(sentences), batch_size):
+        batch = [([sentence(idx)[0] for idx in range(1, sentence.sentence_len)],
+                  [sentence(idx)[1] for idx in range(1, sentence.sentence_len)])
+                 for sentence in sentences[start:start + batch_size]]
+        batch_start = time.perf_counter()
+        parses += parser.parse_batch(batch, budget=budget)
+        latencies.append(time.perf_counter() - batch_start)
+    return parses, latencies
+
+
+if __name__ == '__main__':
+    """latency budgeted decoding benchmark - fallback rate, accuracy and latency percentiles"""
+
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--weights", help="trained weights", required=True)
+    parser.add_argument("--train_data", help="path to the training data of the weights", default='train.labeled')
+    parser.add_argument("--test_data", help="path to test data", default='test.labeled')
+    parser.add_argument("--budgets", help="comma separated per sentence budgets (ms)", default='50,20,10')
+    parser.add_argument("--batch_size", help="sentences per batch of the batch budget runs", default=32)
+    parser.add_argument("--batch_budget", help="optional budget of a batch (ms)", default=None)
+    args = parser.parse_args()
+
+    test_data = Data(args.test_data, is_labeled=True)
+    budgets = [None] + [float(budget) / 1000 for budget in args.budgets.split(',')]
+    for budget in budgets:
+        model = Parser.load(args.weights, args.train_data, budget=budget)
+        parses, latencies = timed_parses(model, test_data.sentences)
+        name = 'no budget' if budget is None else 'budget %.0fms' % (budget * 1000)
+        print('%s: test accuracy: %.4f, fallback rate: %.4f' % (name, uas(test_data.sentences, parses),
+                                                              fallback_rate(parses)))
+        print('%s: latency ms p50 %.1f p90 %.1f p99 %.1f max %.1f' % ((name,) + tuple(percentiles(latencies))))
+
+    if args.batch_budget is not None:
+        batch_budget = float(args.batch_budget) / 1000
+        model = Parser.load(args.weights, args.train_data)
+        parses, latencies = timed_batches(model, test_data.sentences, int(args.batch_size), batch_budget)
+        name = 'batch budget %.0fms' % (batch_budget * 1000)
+        print('%s: test accuracy: %.4f, fallback rate: %.4f' % (name, uas(test_data.sentences, parses),
+                                                              fallback_rate(parses)))
+        print('%s: batch latency ms p50 %.1f p90 %.1f p99 %.1f max %.1f' % ((name,) +
+                                                                           tuple(percentiles(latencies))))
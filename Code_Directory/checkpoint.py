@@ -0,0 +1,53 @@
+# !/usr/bin/env python
+import os
+import pickle
+
+
+class Checkpoint:
+    """epoch level training checkpoint"""
+
+    def __init__(self, directory, name):
+        """init checkpoint file path"""
+        self.path = os.path.join(directory, name + '.ckpt.pickle')
+
+    def exists(self):
+        """return True if a checkpoint was saved"""
+        return os.path.exists(self.path)
+
+    def save(self, state):
+        """save training state, never leave a half written checkpoint behind"""
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        tmp_path = self.path + '.tmp'
+        with open(tmp_path, 'wb') as fh:
+            pickle.dump(state, fh, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp_path, self.path)
+
+    def clear(self):
+        """remove saved checkpoint"""
+        if self.exists():
+            os.remove(self.path)
+
+    def load(self):
+        """load training state, None if there is no checkpoint"""
+        if not self.exists():
+            return None
+        with open(self.path, 'rb') as fh:
+            return pickle.load(fh)
+
+
+if __name__ == '__main__':
+    import tempfile
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        checkpoint = Checkpoint(os.path.join(tmp_dir, 'ckpt'), 'basic')
+        assert checkpoint.load() is None
+        checkpoint.save({'epoch': 3, 'w': [1, 2]})
+        assert checkpoint.exists()
+        assert checkpoint.load() == {'epoch': 3, 'w': [1, 2]}
+        assert not os.path.exists(checkpoint.path + '.tmp')
+        checkpoint.clear()
+        assert not checkpoint.exists()
+
+    print('PASSED!')
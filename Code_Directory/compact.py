@@ -0,0 +1,116 @@
+# !/usr/bin/env python
+from feature_store import *
+from lexicon import *
+import numpy as np
+
+INT_TYPES = [np.int8, np.int16, np.int32, np.int64]
+
+
+def narrowest_dtype(values):
+    """return the narrowest signed integer type holding all values"""
+    low, high = (int(values.min()), int(values.max())) if len(values) else (0, 0)
+    for dtype in INT_TYPES:
+        if np.iinfo(dtype).min <= low and high <= np.iinfo(dtype).max:
+            return dtype
+    raise ValueError('weights out of int64 range')
+
+
+def quantize(w, bits):
+    """
+    scale weights into signed 'bits' integers, return quantized weights and scale
+    all scores are scaled alike, so the decoding only loses the resolution of the rounding
+    """
+    scale = max(float(np.abs(w).max()) / (2 ** (bits - 1) - 1), 1.0) if len(w) else 1.0
+    return np.round(w / scale).astype(np.int64), scale
+
+
+def compact(features, w, labeler=None, index=None, bits=None):
+    """
+    export a trained model for inference
+    zero weights are dropped, the kept features are keyed in a new FeatureIndex and weights are stored
+    in the narrowest integer type (or quantized to 'bits' bits)
+    :param index: FeatureIndex of a stable model, None for the dense templates layout
+    :return: model dictionary, loadable like a stable model
+    """
+    scale = 1.0
+    if bits is not None:
+        w, scale = quantize(w, bits)
+
+    # arc features - one weight per feature
+    if index is not None:
+        keys, ids = index.items(0, features.features_num())
+        keep = w[ids] != 0
+        keys, ids = keys[keep], ids[keep]
+    else:
+        ids = np.flatnonzero(w[:features.features_len()])
+        keys = dense_keys(ids, window_list(features))
+    compact_keys, compact_ids, compact_w = [keys], [np.arange(len(ids), dtype=np.int64)], [w[ids]]
+    size = len(ids)
+
+    # relation features - a block of weights per feature, kept if any relation weight is not zero
+    if labeler is not None:
+        width = len(labeler.relation_list)
+        keys, bases = labeler.relation_items()
+        blocks = w[bases[:, None] + np.arange(width)]
+        keep = blocks.any(axis=1)
+        compact_keys.append(keys[keep])
+        compact_ids.append(size + np.arange(keep.sum(), dtype=np.int64) * width)
+        compact_w.append(blocks[keep].ravel())
+        size += int(keep.sum()) * width
+
+    compact_w = np.concatenate(compact_w)
+    compact_w = compact_w.astype(narrowest_dtype(compact_w))
+    compact_ids = np.concatenate(compact_ids)
+    compact_index = FeatureIndex.from_items(np.concatenate(compact_keys),
+                                            compact_ids.astype(narrowest_dtype(compact_ids)), size)
+    return {'features': features, 'index': compact_index, 'w': compact_w, 'scale': scale,
+            'labeler': labeler.reindexed(compact_index) if labeler is not None else None}
+
+
+if __name__ == '__main__':
+    from features import *
+    from labeler import *
+    from perceptron import *
+
+    assert narrowest_dtype(np.array([-128, 127])) == np.int8
+    assert narrowest_dtype(np.array([-5, 200])) == np.int16
+    assert narrowest_dtype(np.array([1 << 40])) == np.int64
+    assert quantize(np.array([-254, 127, 1]), 8)[0].tolist() == [-127, 64, 0]
+
+    vocab_list = ['ofir', 'tomer', 'nadav', 'roy']
+    pos_list = ['S', 'T']
+    word_pos_pairs = [('ofir', 'S'), ('tomer', 'S'), ('nadav', 'T'), ('roy', 'T')]
+    complex = ComplexFeatures(vocab_list, pos_list, word_pos_pairs)
+    sentences = [Sentence(['ofir', 'roy', 'tomer'], ['S', 'T', 'S']), Sentence(['nadav', 'roy'], ['T', 'T']),
+                 Sentence(['roy', 'ofir', 'nadav', 'tomer'], ['T', 'S', 'T', 'S'])]
+    random_state = np.random.RandomState(0)
+
+    # validate dense and indexed models decode identically after compaction
+    dense_labeler = Labeler(['NMOD', 'P', 'ROOT'], window_list(complex))
+    dense_w = random_state.randint(-3, 4, complex.features_len() + dense_labeler.weights_len()) * 40
+    dense_w[random_state.rand(len(dense_w)) < 0.5] = 0
+    index = FeatureIndex()
+    indexed_labeler = Labeler(['NMOD', 'P', 'ROOT'], window_list(complex), index=index)
+    for sentence in sentences:
+        shifts = sentence_shifts(sentence, complex)
+        index.add(shifts)
+        indexed_labeler.index_features(shifts, sentence.sentence_len)
+    indexed_w = random_state.randint(-3, 4, index.size())
+    for w, labeler, layout_index in [(dense_w, dense_labeler, None), (indexed_w, indexed_labeler, index)]:
+        model = compact(complex, w, labeler, layout_index)
+        assert model['w'].dtype == np.int8 and len(model['w']) < len(w) and model['index'].size() == len(model['w'])
+        layout = layout_index if layout_index is not None else DenseLayout(window_list(complex))
+        for sentence in sentences:
+            shifts = sentence_shifts(sentence, complex)
+            assert (scores_matrix(w, shifts, layout, sentence.sentence_len) ==
+                    scores_matrix(model['w'], shifts, model['index'], sentence.sentence_len)).all()
+            assert (labeler.scores_tensor(w, shifts, sentence.sentence_len) ==
+                    model['labeler'].scores_tensor(model['w'], shifts, sentence.sentence_len)).all()
+            assert labeled_decode(w, shifts, layout, sentence.sentence_len, labeler) == \
+                labeled_decode(model['w'], shifts, model['index'], sentence.sentence_len, model['labeler'])
+
+    # validate unlabeled models and quantization
+    model = compact(complex, dense_w[:complex.features_len()] * 100, bits=8)
+    assert model['labeler'] is None and model['scale'] > 1 and model['w'].dtype == np.int8
+
+    print('PASSED!')
@@ -0,0 +1,174 @@
+# !/usr/bin/env python
+from data import *
+from lexicon import *
+import numpy as np
+import os
+import pickle
+import shutil
+import tempfile
+
+CORPUS_SUFFIX = '.corpus'
+META_FILE = 'meta.pickle'
+
+
+def corpus_path(directory, name):
+    """return path of a corpus array or meta file"""
+    return os.path.join(directory, name)
+
+
+def convert(file_name, is_labeled, directory=None):
+    """
+    one-time conversion of a CoNLL file to a binary corpus directory
+    tokens are stored as interned word / pos ids, sentence i is tokens [offsets[i], offsets[i + 1])
+    the corpus is written to a temporary directory that replaces the old one, processes that memory-mapped
+    the old corpus keep reading its (unlinked) files
+    :return: corpus directory
+    """
+    directory = directory or file_name + CORPUS_SUFFIX
+    data = Data(file_name, is_labeled)
+    words, tags, relations = Lexicon(), Lexicon(), Lexicon()
+    word_ids, pos_ids, heads, relation_ids = [], [], [], []
+    offsets = [0]
+    for sentence in data.sentences:
+        for idx in range(1, sentence.sentence_len):
+            word, pos = sentence(idx)
+            word_ids.append(words.add(word))
+            pos_ids.append(tags.add(pos))
+        if is_labeled:
+            heads.extend(sentence.dependency_tree()[m] for m in range(1, sentence.sentence_len))
+            relation_ids.extend(relations.add(sentence.relations()[m]) for m in range(1, sentence.sentence_len))
+        offsets.append(len(word_ids))
+
+    arrays = {'words': np.array(word_ids, dtype=np.int32), 'pos': np.array(pos_ids, dtype=np.int32),
+              'offsets': np.array(offsets, dtype=np.int64)}
+    if is_labeled:
+        arrays['heads'] = np.array(heads, dtype=np.int32)
+        arrays['relations'] = np.array(relation_ids, dtype=np.int32)
+    meta = {'is_labeled': is_labeled, 'words': list(words), 'pos': list(tags), 'relations': list(relations),
+            'vocab_list': data.vocab_list, 'pos_list': data.pos_list, 'word_pos_pairs': data.word_pos_pairs,
+            'relation_list': data.relation_list}
+
+    parent = os.path.dirname(os.path.abspath(directory))
+    os.makedirs(parent, exist_ok=True)
+    tmp_directory = tempfile.mkdtemp(prefix=os.path.basename(directory) + '.tmp', dir=parent)
+    os.chmod(tmp_directory, 0o755)
+    write_corpus(tmp_directory, arrays, meta)
+    if os.path.exists(directory):
+        old_directory = tmp_directory + '.old'
+        os.replace(directory, old_directory)
+        os.replace(tmp_directory, directory)
+        shutil.rmtree(old_directory)
+    else:
+        os.replace(tmp_directory, directory)
+    return directory
+
+
+def write_corpus(directory, arrays, meta):
+    """write name -> array dictionary and meta into a corpus directory"""
+    for name, array in arrays.items():
+        np.save(corpus_path(directory, name + '.npy'), array)
+    # meta is written last, a corpus without it is incomplete
+    pickle.dump(meta, open(corpus_path(directory, META_FILE), 'wb'))
+
+
+class CorpusSentences:
+    """read-only sentences sequence over memory-mapped corpus arrays, sentences are built on access"""
+
+    def __init__(self, directory, meta):
+        """memory-map corpus arrays"""
+        self._words = meta['words']
+        self._pos = meta['pos']
+        self._relations = meta['relations']
+        self._word_ids = np.load(corpus_path(directory, 'words.npy'), mmap_mode='r')
+        self._pos_ids = np.load(corpus_path(directory, 'pos.npy'), mmap_mode='r')
+        self._offsets = np.load(corpus_path(directory, 'offsets.npy'), mmap_mode='r')
+        self._is_labeled = meta['is_labeled']
+        if self._is_labeled:
+            self._heads = np.load(corpus_path(directory, 'heads.npy'), mmap_mode='r')
+            self._relation_ids = np.load(corpus_path(directory, 'relations.npy'), mmap_mode='r')
+
+    def __len__(self):
+        """return number of sentences"""
+        return len(self._offsets) - 1
+
+    def __getitem__(self, idx):
+        """return sentence number 'idx', or a list of sentences for a slice"""
+        if isinstance(idx, slice):
+            return [self[i] for i in range(*idx.indices(len(self)))]
+        if idx < 0:
+            idx += len(self)
+        start, end = int(self._offsets[idx]), int(self._offsets[idx + 1])
+        word_list = [self._words[i] for i in self._word_ids[start:end].tolist()]
+        pos_list = [self._pos[i] for i in self._pos_ids[start:end].tolist()]
+        if not self._is_labeled:
+            return Sentence(word_list, pos_list)
+        relations_list = [self._relations[i] for i in self._relation_ids[start:end].tolist()]
+        return LabeledSentence(word_list, pos_list, self._heads[start:end].tolist(), relations_list)
+
+    def __iter__(self):
+        """iterate over all sentences"""
+        for idx in range(len(self)):
+            yield self[idx]
+
+
+class CorpusData:
+    """Data compatible memory-mapped binary corpus"""
+
+    def __init__(self, directory):
+        """load corpus meta and memory-map its arrays, no text is parsed"""
+        meta = pickle.load(open(corpus_path(directory, META_FILE), 'rb'))
+        self.sentences = CorpusSentences(directory, meta)
+        self.sentences_num = len(self.sentences)
+        self.vocab_list, self.pos_list, self.word_pos_pairs = meta['vocab_list'], meta['pos_list'], meta['word_pos_pairs']
+        self.relation_list = meta['relation_list']
+
+
+def load_data(file_name, is_labeled, binary=False):
+    """
+    load a data file
+    :param binary: load the binary corpus of the file, converting it first if it is missing or older than the file
+    """
+    if not binary:
+        return Data(file_name, is_labeled)
+    directory = file_name + CORPUS_SUFFIX
+    meta_file = corpus_path(directory, META_FILE)
+    if not os.path.exists(meta_file) or os.path.getmtime(meta_file) < os.path.getmtime(file_name):
+        convert(file_name, is_labeled, directory)
+    return CorpusData(directory)
+
+
+if __name__ == '__main__':
+    tmp_dir = tempfile.mkdtemp()
+    file_name = os.path.join(tmp_dir, 'toy.labeled')
+    with open(file_name, 'w') as fh:
+        fh.write('1\tofir\t_\tS\t_\t_\t2\tSBJ\t_\t_\n2\troy\t_\tT\t_\t_\t0\tROOT\t_\t_\n\n'
+                 '1\tnadav\t_\tT\t_\t_\t0\tROOT\t_\t_\n2\tofir\t_\tS\t_\t_\t1\tNMOD\t_\t_\n3\t.\t_\tP\t_\t_\t1\tP\t_\t_\n\n')
+
+    # validate corpus against the text data
+    data = Data(file_name, is_labeled=True)
+    corpus = load_data(file_name, is_labeled=True, binary=True)
+    assert os.path.exists(corpus_path(file_name + CORPUS_SUFFIX, META_FILE))
+    assert corpus.sentences_num == data.sentences_num == 2
+    assert corpus.vocab_list == data.vocab_list and corpus.pos_list == data.pos_list
+    assert corpus.word_pos_pairs == data.word_pos_pairs and corpus.relation_list == data.relation_list
+    for sentence, corpus_sentence in zip(data.sentences, corpus.sentences):
+        assert sentence._sentence == corpus_sentence._sentence
+        assert sentence.dependency_tree() == corpus_sentence.dependency_tree()
+        assert sentence.relations() == corpus_sentence.relations()
+    assert [s.sentence_len for s in corpus.sentences[1:]] == [4]
+    assert corpus.sentences[-1](3) == ('.', 'P')
+
+    # reconversion replaces the directory, a mapped corpus keeps its arrays
+    words = corpus.sentences._word_ids
+    with open(file_name, 'a') as fh:
+        fh.write('1\troy\t_\tT\t_\t_\t0\tROOT\t_\t_\n\n')
+    reconverted = CorpusData(convert(file_name, is_labeled=True))
+    assert reconverted.sentences_num == 3 and words.tolist() == [0, 1, 2, 0, 3]
+    assert sorted(os.listdir(tmp_dir)) == ['toy.labeled', 'toy.labeled' + CORPUS_SUFFIX]
+
+    # validate unlabeled corpus
+    corpus = CorpusData(convert(file_name, is_labeled=False, directory=os.path.join(tmp_dir, 'unlabeled')))
+    assert type(corpus.sentences[0]) == Sentence and corpus.relation_list == []
+
+    shutil.rmtree(tmp_dir)
+    print('PASSED!')
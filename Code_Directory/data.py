@@ -7,14 +7,16 @@ def sentence_preprocess(sentence_txt, is_labeled):
     word_list = []
     pos_list = []
     labels_list = []
+    relations_list = []
     for line in sentence_txt.split('\n'):
         args = line.split()
         word_list.append(args[1])
         pos_list.append(args[3])
         if is_labeled:
             labels_list.append(int(args[6]))
+            relations_list.append(args[7])
     if is_labeled:
-        return LabeledSentence(word_list, pos_list, labels_list)
+        return LabeledSentence(word_list, pos_list, labels_list, relations_list)
     return Sentence(word_list, pos_list)
 
 
@@ -36,6 +38,15 @@ def word_pos_wordpos_lists(sentences):
     return sorted(list(word_set)), sorted(list(pos_set)), sorted(list(word_pos_pairs))
 
 
+def dependency_relations(sentences):
+    """generate sorted dependency relations list, empty for unlabeled sentences"""
+    relation_set = set()
+    for sentence in sentences:
+        if isinstance(sentence, LabeledSentence):
+            relation_set.update(sentence.relations().values())
+    return sorted(list(relation_set))
+
+
 class Data:
     """data class"""
 
@@ -48,6 +59,7 @@ class Data:
                     self.sentences.append(sentence_preprocess(sentence_txt, is_labeled))
         self.sentences_num = len(self.sentences)
         self.vocab_list, self.pos_list, self.word_pos_pairs = word_pos_wordpos_lists(self.sentences)
+        self.relation_list = dependency_relations(self.sentences)
 
 
 if __name__ == '__main__':
@@ -75,6 +87,12 @@ if __name__ == '__main__':
     assert comp.sentences[0](3)[0] == 'the'
     assert comp.sentences[0](3)[1] == 'DT'
 
+    # validate relations
+    assert train.sentences[0].relations()[1] == 'NAME'
+    assert train.sentences[0].relations()[8] == 'ROOT'
+    assert 'VMOD' in train.relation_list
+    assert comp.relation_list == []
+
     # validate dependency tree
     tmp_dict = test.sentences[0].dependency_tree()
     assert tmp_dict[4] == [1, 2, 3]
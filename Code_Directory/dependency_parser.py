@@ -0,0 +1,401 @@
+# !/usr/bin/env python
+from data import *
+from features import *
+from perceptron import *
+from transition import *
+from parse_cache import *
+from incremental import *
+from segmented import *
+from budget import *
+from collections import namedtuple
+import asyncio
+import pickle
+import time
+
+# heads[i] is the head of token i + 1 (0 is ROOT), relations is None for unlabeled models
+# degraded is True when the decoding budget ran out and the repaired greedy tree was returned
+Parse = namedtuple('Parse', ['heads', 'relations', 'degraded'], defaults=[False])
+
+
+class BaseParser:
+    """
+    in-process dependency parser over a trained model, shared by the graph and transition parsers
+    subclasses provide parse(tokens, tags) and parse_batch(sentences, workers=1, budget=None)
+    """
+
+    def __init__(self, features, w, labeler=None, index=None, max_batch=32, max_delay=0.005, cache=None):
+        """
+        :param features: features object the model was trained with
+        :param w: model weights
+        :param labeler: optional Labeler of a labeled model
+        :param index: optional FeatureIndex of a stable model
+        :param max_batch: max sentences per async micro-batch
+        :param max_delay: max seconds an async caller waits for its micro-batch to fill
+        :param cache: optional ParseCache of this model, repeated sentences are decoded once
+        """
+        self._features = features
+        self._w = w
+        self._labeler = labeler
+        self._cache = cache
+        self._layout = index if index is not None else DenseLayout(window_list(features))
+        self._max_batch = max_batch
+        self._max_delay = max_delay
+        self._queue = None
+        self._batcher = None
+        self._loop = None
+
+    @staticmethod
+    def load(file_name, train_file='train.labeled', **kwargs):
+        """
+        load a model saved by main.py
+        stable models carry their features, plain weights files rebuild them from the training data
+        """
+        with open(file_name, 'rb') as fh:
+            model = pickle.load(fh)
+        if isinstance(model, dict) and model.get('transition'):
+            return TransitionParser(model['features'], model['w'], model['index'], **kwargs)
+        if isinstance(model, dict):
+            return Parser(model['features'], model['w'], model['labeler'], model['index'], **kwargs)
+        train_data = Data(train_file, is_labeled=True)
+        features_class = BasicFeatures if 'basic' in file_name else ComplexFeatures
+        features = features_class(train_data.vocab_list, train_data.pos_list, train_data.word_pos_pairs)
+        labeler = None
+        if 'labeled' in file_name:
+            labeler = Labeler(train_data.relation_list, window_list(features))
+        return Parser(features, model, labeler, **kwargs)
+
+    def model_identity(self):
+        """return identity of the model, see ParseCache"""
+        return model_identity(self._w, self._features, self._labeler)
+
+    def enable_cache(self, max_size=100000, file_name=None):
+        """cache parses of this model, see ParseCache, return the cache"""
+        self._cache = ParseCache(self.model_identity(), max_size, file_name)
+        return self._cache
+
+    def _cache_put(self, sentence, decoded):
+        """cache a decoded sentence, degraded decodings are not cached"""
+        if self._cache is not None and not (len(decoded) > 2 and decoded[2]):
+            self._cache.put(sentence, decoded[:2])
+
+    def _parse(self, decoded, sentence_len):
+        """convert decoded parents and relation index dictionaries into a Parse"""
+        parents, relation_ids = decoded[:2]
+        degraded = len(decoded) > 2 and decoded[2]
+        heads = [parents[m] for m in range(1, sentence_len)]
+        if relation_ids is None:
+            return Parse(heads, None, degraded)
+        return Parse(heads, [self._labeler.relation_list[relation_ids[m]] for m in range(1, sentence_len)], degraded)
+
+    def parse_stream(self, sentences, batch_size=64):
+        """lazily parse an iterable of (tokens, tags) pairs, yield one Parse per sentence"""
+        batch = []
+        for sentence in sentences:
+            batch.append(sentence)
+            if len(batch) == batch_size:
+                for parse in self.parse_batch(batch):
+                    yield parse
+                batch = []
+        for parse in self.parse_batch(batch):
+            yield parse
+
+    async def parse_async(self, tokens, tags):
+        """
+        parse a sentence without blocking the event loop, concurrent callers share micro-batches
+        the batching task runs on the loop of the caller, it is restarted on a new loop or if it stopped
+        """
+        loop = asyncio.get_running_loop()
+        if self._batcher is None or self._batcher.done() or self._loop is not loop:
+            self._loop = loop
+            self._queue = asyncio.Queue()
+            self._batcher = loop.create_task(self._batch_loop())
+        future = loop.create_future()
+        await self._queue.put(((tokens, tags), future))
+        return await future
+
+    async def _batch_loop(self):
+        """collect queued requests into micro-batches and decode them in the default executor"""
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = [await self._queue.get()]
+            deadline = loop.time() + self._max_delay
+            while len(batch) < self._max_batch:
+                timeout = deadline - loop.time()
+                if timeout <= 0:
+                    break
+                try:
+                    batch.append(await asyncio.wait_for(self._queue.get(), timeout))
+                except asyncio.TimeoutError:
+                    break
+            try:
+                parses = await loop.run_in_executor(None, self.parse_batch, [sentence for sentence, _ in batch])
+                for (_, future), parse in zip(batch, parses):
+                    if not future.done():
+                        future.set_result(parse)
+            except Exception as e:
+                for _, future in batch:
+                    if not future.done():
+                        future.set_exception(e)
+
+    async def close(self):
+        """stop the async micro-batching task"""
+        if self._batcher is not None:
+            self._batcher.cancel()
+            try:
+                await self._batcher
+            except asyncio.CancelledError:
+                pass
+            self._batcher = None
+            self._queue = None
+            self._loop = None
+
+
+class Parser(BaseParser):
+    """in-process graph based (MST) dependency parser, supports segmented, budgeted and incremental parsing"""
+
+    def __init__(self, features, w, labeler=None, index=None, max_batch=32, max_delay=0.005, cache=None,
+                 segment_len=None, budget=None):
+        """
+        see BaseParser
+        :param segment_len: optional max words of a sentence decoded whole, longer ones are decoded by segments
+        :param budget: optional seconds per sentence, a sentence over it gets a degraded (greedy) parse
+        """
+        super(Parser, self).__init__(features, w, labeler, index, max_batch, max_delay, cache)
+        if segment_len is not None and segment_len < 1:
+            raise ValueError('segment_len must be at least 1, got %r' % segment_len)
+        self._segment_len = segment_len
+        self._budget = budget
+
+    def _decode(self, shifts, sentence_len, deadline=None):
+        """
+        decode one sentence features, return parents and relation index dictionaries
+        with a deadline, a third True / False item tells if the decoding was degraded
+        """
+        if deadline is None:
+            return labeled_decode(self._w, shifts, self._layout, sentence_len, self._labeler)
+        return budgeted_decode(self._w, shifts, self._layout, sentence_len, self._labeler, deadline)
+
+    def _deadline(self, start, batch_deadline=None):
+        """return deadline of a sentence decoding started at 'start', None without a budget"""
+        deadline = start + self._budget if self._budget is not None else None
+        if batch_deadline is None:
+            return deadline
+        return batch_deadline if deadline is None else min(deadline, batch_deadline)
+
+    def _segmented(self, sentence):
+        """return True if the sentence is decoded by segments"""
+        return self._segment_len is not None and sentence.sentence_len - 1 > self._segment_len
+
+    def _decode_sentence(self, sentence, deadline=None):
+        """
+        extract and decode one sentence, against the deadline if given, see budgeted_sentence_decode
+        a sentence whose deadline passes before its features are extracted gets the chain parse, see chain_decode
+        """
+        if deadline is not None and time.perf_counter() > deadline:
+            return chain_decode(self._w, sentence, self._features, self._labeler)
+        if self._segmented(sentence):
+            return segmented_decode(self._w, sentence, self._features, self._layout, self._labeler, self._segment_len,
+                                    deadline=deadline)
+        if deadline is None:
+            return self._decode(sentence_shifts(sentence, self._features), sentence.sentence_len)
+        return budgeted_sentence_decode(self._w, sentence, self._features, self._layout, self._labeler, deadline)
+
+    def parse(self, tokens, tags):
+        """parse a single tagged sentence"""
+        start = time.perf_counter()
+        sentence = Sentence(tokens, tags)
+        decoded = self._cache.get(sentence) if self._cache is not None else None
+        if decoded is None:
+            decoded = self._decode_sentence(sentence, self._deadline(start))
+            self._cache_put(sentence, decoded)
+        return self._parse(decoded, sentence.sentence_len)
+
+    def parse_batch(self, sentences, workers=1, budget=None):
+        """
+        parse a list of (tokens, tags) pairs, features are extracted over 'workers' processes
+        with a cache, only the first occurrence of every uncached sentence is extracted and decoded
+        :param budget: optional seconds for the whole batch, sentences decoded after it get degraded parses
+        the per sentence budget of the parser counts from the extraction of every sentence
+        with a budget, sentences are extracted one by one against their deadline instead of over 'workers' processes
+        """
+        batch_deadline = time.perf_counter() + budget if budget is not None else None
+        sentences = [Sentence(tokens, tags) for tokens, tags in sentences]
+        if self._cache is None:
+            keys = [idx for idx in range(len(sentences))]
+        else:
+            keys = [self._cache.key(sentence) for sentence in sentences]
+        decoded = dict()
+        misses = dict()
+        for key, sentence in zip(keys, sentences):
+            if key in decoded or key in misses:
+                continue
+            hit = self._cache.get(sentence) if self._cache is not None else None
+            if hit is None:
+                misses[key] = sentence
+            else:
+                decoded[key] = hit
+        if self._budget is not None or batch_deadline is not None:
+            for key, sentence in misses.items():
+                decoded[key] = self._decode_sentence(sentence, self._deadline(time.perf_counter(), batch_deadline))
+        else:
+            whole = [(key, sentence) for key, sentence in misses.items() if not self._segmented(sentence)]
+            store = FeatureStore([sentence for _, sentence in whole], self._features, workers)
+            for idx, (key, sentence) in enumerate(whole):
+                decoded[key] = self._decode(store[idx], sentence.sentence_len)
+        for key, sentence in misses.items():
+            if key not in decoded:
+                decoded[key] = self._decode_sentence(sentence)
+            self._cache_put(sentence, decoded[key])
+        return [self._parse(decoded[key], sentence.sentence_len) for key, sentence in zip(keys, sentences)]
+
+    def parse_scored(self, tokens, tags):
+        """parse a single tagged sentence, return Parse and the ScoredSentence to re-parse edits from"""
+        scored = score_sentence(self._w, Sentence(tokens, tags), self._features, self._layout, self._labeler)
+        return self._parse(decode_scored(scored), scored.sentence.sentence_len), scored
+
+    def reparse(self, scored, edits):
+        """
+        re-parse an edited sentence, only the arcs whose features read an edited token are rescored
+        :param scored: ScoredSentence of the sentence before the edit
+        :param edits: token index -> (token, tag) dictionary of the replaced tokens
+        :return: Parse and ScoredSentence of the edited sentence
+        """
+        sentence = scored.sentence
+        tokens = [sentence(idx)[0] for idx in range(1, sentence.sentence_len)]
+        tags = [sentence(idx)[1] for idx in range(1, sentence.sentence_len)]
+        for idx, (token, tag) in edits.items():
+            tokens[idx], tags[idx] = token, tag
+        scored, _ = rescore(self._w, scored, Sentence(tokens, tags), self._features, self._layout, self._labeler)
+        return self._parse(decode_scored(scored), scored.sentence.sentence_len), scored
+
+
+class TransitionParser(BaseParser):
+    """
+    in-process linear time transition based parser, unlabeled
+    it keeps no arc scores, so it has no incremental re-parse (parse_scored / reparse)
+    """
+
+    def __init__(self, features, w, index, max_batch=32, max_delay=0.005, cache=None, segment_len=None,
+                 budget=None):
+        """
+        see BaseParser
+        :param index: FeatureIndex of the configuration features
+        :param segment_len: ignored, linear time decoding doesn't need segments
+        :param budget: ignored, linear time decoding has no slower exact path to fall back from
+        """
+        super(TransitionParser, self).__init__(features, w, index=index, max_batch=max_batch, max_delay=max_delay,
+                                               cache=cache)
+        self._templates_num = features.features_num()
+
+    def model_identity(self):
+        """return identity of the model, see ParseCache"""
+        return 'transition' + model_identity(self._w, self._features)
+
+    def parse(self, tokens, tags):
+        """parse a single tagged sentence"""
+        sentence = Sentence(tokens, tags)
+        decode = lambda: (transition_decode(self._w, self._layout, sentence, self._features, self._templates_num),
+                          None)
+        decoded = decode() if self._cache is None else self._cache.lookup(sentence, decode)
+        return self._parse(decoded, sentence.sentence_len)
+
+    def parse_batch(self, sentences, workers=1, budget=None):
+        """parse a list of (tokens, tags) pairs, sentences are decoded one by one in linear time, see __init__"""
+        return [self.parse(tokens, tags) for tokens, tags in sentences]
+
+
+if __name__ == '__main__':
+    vocab_list = ['ofir', 'tomer', 'nadav', 'roy']
+    pos_list = ['S', 'T']
+    word_pos_pairs = [('ofir', 'S'), ('tomer', 'S'), ('nadav', 'T'), ('roy', 'T')]
+    features = ComplexFeatures(vocab_list, pos_list, word_pos_pairs)
+    labeler = Labeler(['NMOD', 'P', 'ROOT'], window_list(features))
+    w = np.random.RandomState(0).randint(-5, 5, features.features_len() + labeler.weights_len())
+    parser = Parser(features, w, labeler)
+    sentences = [(['ofir', 'roy', 'tomer'], ['S', 'T', 'S']), (['nadav', 'roy'], ['T', 'T']),
+                 (['roy', 'ofir', 'nadav', 'tomer'], ['T', 'S', 'T', 'S'])]
+
+    # validate single parse against the perceptron decoding
+    parse = parser.parse(*sentences[0])
+    sentence = Sentence(*sentences[0])
+    parents, relation_ids = labeled_decode(w, sentence_shifts(sentence, features), DenseLayout(window_list(features)),
+                                           sentence.sentence_len, labeler)
+    assert parse.heads == [parents[m] for m in range(1, 4)]
+    assert parse.relations == [labeler.relation_list[relation_ids[m]] for m in range(1, 4)]
+
+    # validate batch and stream
+    expected = [parser.parse(tokens, tags) for tokens, tags in sentences]
+    assert parser.parse_batch(sentences) == expected
+    assert list(parser.parse_stream(iter(sentences), batch_size=2)) == expected
+
+    # validate async micro-batching
+    async def parse_concurrently():
+        parses = await asyncio.gather(*[parser.parse_async(tokens, tags) for tokens, tags in sentences * 3])
+        await parser.close()
+        return parses
+
+    assert asyncio.run(parse_concurrently()) == expected * 3
+
+    # a loop closed without close() doesn't hang the next one
+    async def parse_unclosed():
+        return await asyncio.wait_for(parser.parse_async(*sentences[0]), 60)
+
+    assert asyncio.run(parse_unclosed()) == expected[0] and asyncio.run(parse_unclosed()) == expected[0]
+
+    # validate cached parsing, duplicates are decoded once
+    cached_parser = Parser(features, w, labeler)
+    cache = cached_parser.enable_cache()
+    assert cached_parser.parse_batch(sentences + sentences[:2]) == expected + expected[:2]
+    assert (cache.hits, cache.misses, len(cache)) == (0, 3, 3)
+    assert cached_parser.parse(*sentences[1]) == expected[1] and cache.hits == 1
+    assert list(cached_parser.parse_stream(sentences, batch_size=3)) == expected and cache.hits == 4
+
+    # validate segmented decoding of long sentences only
+    segmented_parser = Parser(features, w, labeler, segment_len=3)
+    try:
+        Parser(features, w, labeler, segment_len=0)
+        assert False
+    except ValueError:
+        pass
+    assert segmented_parser.parse_batch(sentences)[:2] == expected[:2]
+    assert segmented_parser.parse(*sentences[2]) == segmented_parser.parse_batch(sentences)[2]
+
+    # validate budgeted parsing - within the budget parses are exact, over it degraded and not cached
+    budget_parser = Parser(features, w, labeler, budget=60)
+    assert budget_parser.parse_batch(sentences) == expected and budget_parser.parse(*sentences[0]) == expected[0]
+    budget_parser = Parser(features, w, labeler, budget=0)
+    cache = budget_parser.enable_cache()
+    parses = budget_parser.parse_batch(sentences) + [budget_parser.parse(*sentences[2])]
+    assert all(parse.degraded for parse in parses) and len(cache) == 0
+    assert [len(parse.heads) for parse in parses] == [3, 2, 4, 4]
+    assert all(parse.degraded for parse in parser.parse_batch(sentences, budget=0))
+    assert not any(parse.degraded for parse in parser.parse_batch(sentences, budget=60))
+
+    # validate incremental re-parse against parsing the edited sentence
+    parse, scored = parser.parse_scored(*sentences[2])
+    assert parse == expected[2]
+    parse, scored = parser.reparse(scored, {1: ('nadav', 'T'), 3: ('tomer', 'T')})
+    assert parse == parser.parse(['roy', 'nadav', 'nadav', 'tomer'], ['T', 'T', 'T', 'T'])
+    assert parser.reparse(scored, {})[0] == parse
+
+    # validate transition based parser
+    class ToyData:
+        sentences = [LabeledSentence(['ofir', 'roy', 'tomer'], ['S', 'T', 'S'], [2, 0, 2])]
+
+    index = FeatureIndex()
+    transition_w = TransitionPerceptron(ToyData, features, index, grow_index=True).train(3)
+    transition_parser = TransitionParser(features, transition_w, index)
+    assert transition_parser.parse(*sentences[0]) == Parse([2, 0, 2], None)
+    assert len(transition_parser.parse_batch(sentences)[2].heads) == 4
+    assert not hasattr(transition_parser, 'parse_scored') and not hasattr(transition_parser, 'reparse')
+
+    # transition models load with the graph parser options, batch budgets are accepted
+    import tempfile
+    with tempfile.NamedTemporaryFile(suffix='.pickle') as fh:
+        pickle.dump({'transition': True, 'features': features, 'w': transition_w, 'index': index}, fh)
+        fh.flush()
+        transition_parser = Parser.load(fh.name, budget=0, segment_len=2)
+    assert type(transition_parser) is TransitionParser
+    assert transition_parser.parse_batch(sentences, budget=0)[0] == Parse([2, 0, 2], None)
+
+    print('PASSED!')
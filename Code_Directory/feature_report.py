@@ -0,0 +1,182 @@
+# !/usr/bin/env python
+from feature_store import *
+from collections import namedtuple
+import numpy as np
+
+# seen and nonzero are None when the data / weights aren't given
+TemplateReport = namedtuple('TemplateReport', ['name', 'offset', 'size', 'seen', 'nonzero', 'store_bytes',
+                                               'model_bytes'])
+
+SHIFT_BYTES = np.dtype(np.int32).itemsize
+INDEX_ENTRY_BYTES = 2 * np.dtype(np.int64).itemsize  # FeatureIndex key and weight index
+
+
+def seen_counts(features, sentences=None, store=None):
+    """return number of distinct ids of every template, from a FeatureStore or extracted sentence by sentence"""
+    if store is not None:
+        return [len(np.unique(column[column != -1])) for column in store.shifts.T]
+    seen = [np.zeros(size, dtype=bool) for size in window_list(features)]
+    for sentence in sentences:
+        for template, column in enumerate(sentence_shifts(sentence, features).T):
+            seen[template][column[column != -1]] = True
+    return [int(mask.sum()) for mask in seen]
+
+
+def gold_counts(features, sentences, store=None):
+    """return per template arrays of the number of gold arcs of every id, sentences must be labeled"""
+    counts = [np.zeros(size, dtype=np.int64) for size in window_list(features)]
+    for idx, sentence in enumerate(sentences):
+        tree = sentence.dependency_tree()
+        if store is not None:
+            rows = arc_rows(sentence.sentence_len)
+            shifts = store[idx][[rows[h, m] for m, h in tree.items()]]
+        else:
+            shifts = np.array([[shift for shift, _ in features(h, m, sentence)] for m, h in tree.items()],
+                              dtype=np.int32)
+        for template, column in enumerate(shifts.T):
+            np.add.at(counts[template], column[column != -1], 1)
+    return counts
+
+
+def template_report(features, sentences=None, store=None, w=None, index=None, labeler=None, min_count=None):
+    """
+    per template layout and occupancy report
+    :param sentences: optional sentences to count distinct ids and arcs of (extracted one by one, nothing is kept)
+    :param store: optional FeatureStore of the sentences, used instead of extracting them
+    :param w: optional trained weights, counts nonzero weights
+    :param index: FeatureIndex of a stable model, None for the dense templates layout
+    :param labeler: optional Labeler, reported as a single 'relations' row
+    :param min_count: minimum number of gold arcs of an indexed feature, int or per template list
+    :return: list of TemplateReport
+    model bytes of an empty (untrained) index are estimated from the seen ids, every seen feature gets indexed,
+    or only the features of gold arcs (labeled sentences) seen at least min_count times
+    """
+    names = features.template_names()
+    sizes = window_list(features)
+    offsets = np.cumsum([0] + sizes)
+    weight_bytes = w.itemsize if w is not None else np.dtype(int).itemsize
+    arcs_num = None
+    if store is not None:
+        arcs_num = len(store.shifts)
+    elif sentences is not None:
+        arcs_num = sum((sentence.sentence_len - 1) ** 2 for sentence in sentences)
+    seen = [None] * len(sizes)
+    if store is not None or sentences is not None:
+        seen = seen_counts(features, sentences, store)
+    estimate = index is not None and len(index) == 0 and seen[0] is not None
+    indexed = seen
+    if estimate and min_count is not None:
+        if sentences is None:
+            raise ValueError('min_count estimates count gold arcs, they need the labeled sentences')
+        min_counts = np.broadcast_to(np.asarray(min_count, dtype=np.int64), (len(sizes),))
+        indexed = [int((counts >= k).sum()) for counts, k in zip(gold_counts(features, sentences, store), min_counts)]
+
+    rows = []
+    for template, (name, size) in enumerate(zip(names, sizes)):
+        if index is not None:
+            ids = index.items(template, template + 1)[1]
+            model_bytes = (indexed[template] if estimate else len(ids)) * (INDEX_ENTRY_BYTES + weight_bytes)
+        else:
+            ids = np.arange(offsets[template], offsets[template + 1])
+            model_bytes = size * weight_bytes
+        nonzero = int(np.count_nonzero(w[ids])) if w is not None else None
+        store_bytes = arcs_num * SHIFT_BYTES if arcs_num is not None else None
+        rows.append(TemplateReport(name, int(offsets[template]), size, seen[template], nonzero, store_bytes,
+                                   model_bytes))
+
+    if labeler is not None:
+        keys, bases = labeler.relation_items()
+        blocks = bases[:, None] + np.arange(len(labeler.relation_list))
+        nonzero = int(np.count_nonzero(w[blocks])) if w is not None else None
+        if estimate:
+            keys_num = labeler.features_num(indexed)
+            model_bytes = keys_num * (len(labeler.relation_list) * weight_bytes + INDEX_ENTRY_BYTES)
+        else:
+            model_bytes = blocks.size * weight_bytes + (len(keys) * INDEX_ENTRY_BYTES if index is not None else 0)
+        rows.append(TemplateReport('relations', int(offsets[-1]), labeler.weights_len(), None, nonzero, None,
+                                   model_bytes))
+    return rows
+
+
+def format_report(rows):
+    """return report table text with a total row"""
+    def cell(value):
+        return '-' if value is None else str(value)
+
+    def total(values):
+        values = [value for value in values if value is not None]
+        return sum(values) if values else None
+
+    lines = [TemplateReport._fields]
+    lines += [[cell(value) for value in row] for row in rows]
+    lines.append(['total', '-', cell(total(row.size for row in rows)), cell(total(row.seen for row in rows)),
+                  cell(total(row.nonzero for row in rows)), cell(total(row.store_bytes for row in rows)),
+                  cell(total(row.model_bytes for row in rows))])
+    widths = [max(len(line[col]) for line in lines) for col in range(len(lines[0]))]
+    return '\n'.join('  '.join(value.ljust(width) for value, width in zip(line, widths)).rstrip() for line in lines)
+
+
+if __name__ == '__main__':
+    from features import *
+    from labeler import *
+
+    vocab_list = ['ofir', 'tomer', 'nadav', 'roy']
+    pos_list = ['S', 'T']
+    word_pos_pairs = [('ofir', 'S'), ('tomer', 'S'), ('nadav', 'T'), ('roy', 'T')]
+    basic = BasicFeatures(vocab_list, pos_list, word_pos_pairs)
+    sentences = [Sentence(['ofir', 'roy'], ['S', 'T']), Sentence(['tomer', 'nadav', 'roy'], ['S', 'T', 'T'])]
+
+    # layout only
+    rows = template_report(basic)
+    assert [row.offset for row in rows[:3]] == [0, 4, 8] and rows[2].size == 2
+    assert rows[0].seen is None and rows[0].nonzero is None and rows[0].model_bytes == 4 * 8
+
+    # seen ids from extraction and from a store agree
+    rows = template_report(basic, sentences)
+    store = FeatureStore(sentences, basic)
+    assert rows == template_report(basic, store=store)
+    assert rows[2].seen == 2 and rows[0].seen == 4 and rows[0].store_bytes == (2 ** 2 + 3 ** 2) * 4
+
+    # nonzero weights of dense and indexed models
+    labeler = Labeler(['NMOD', 'P'], window_list(basic))
+    w = np.zeros(basic.features_len() + labeler.weights_len(), dtype=int)
+    w[[1, 8, basic.features_len() + 1]] = 1
+    rows = template_report(basic, w=w, labeler=labeler)
+    assert rows[0].nonzero == 1 and rows[2].nonzero == 1 and rows[-1].nonzero == 1 and rows[-1].name == 'relations'
+    index = FeatureIndex()
+    index.add(store.shifts)
+    rows = template_report(basic, w=np.ones(index.size(), dtype=np.int8), index=index)
+    assert rows[2].nonzero == 2 and rows[2].model_bytes == 2 * (16 + 1)
+
+    report = format_report(rows)
+    assert report.splitlines()[0].split() == list(TemplateReport._fields)
+    assert report.splitlines()[-1].split()[4] == str(len(index))
+
+    # untrained stable model - indexed bytes are estimated from the seen ids
+    labeler = Labeler(['NMOD', 'P'], window_list(basic), index=FeatureIndex())
+    rows = template_report(basic, sentences, index=FeatureIndex(), labeler=labeler)
+    assert rows[0].model_bytes == 4 * (16 + 8) and rows[2].model_bytes == 2 * (16 + 8)
+    assert rows[-1].model_bytes == labeler.features_num([row.seen for row in rows[:-1]]) * (2 * 8 + 16)
+    assert template_report(basic, index=FeatureIndex())[0].model_bytes == 0
+
+    # thresholded estimate - the features of gold arcs seen at least min_count times
+    sentences = [LabeledSentence(['ofir', 'roy', 'tomer'], ['S', 'T', 'S'], [2, 0, 2]),
+                 LabeledSentence(['tomer', 'roy'], ['S', 'T'], [2, 0])]
+    store = FeatureStore(sentences, basic)
+    gold_shifts = np.concatenate([store[idx][[arc_rows(sentence.sentence_len)[h, m]
+                                              for m, h in sentence.dependency_tree().items()]]
+                                  for idx, sentence in enumerate(sentences)])
+    for min_count in [1, 2, [2, 1, 1, 1, 1, 1, 1, 1, 3]]:
+        index = FeatureIndex()
+        index.add(gold_shifts, min_count=min_count)
+        rows = template_report(basic, sentences, index=FeatureIndex(), min_count=min_count)
+        assert rows == template_report(basic, sentences, store, index=FeatureIndex(), min_count=min_count)
+        assert [row.model_bytes // (16 + 8) for row in rows] == [len(index.items(t, t + 1)[1]) for t in range(9)]
+    assert sum(row.model_bytes for row in rows) < sum(row.seen for row in rows) * (16 + 8)
+    try:
+        template_report(basic, store=store, index=FeatureIndex(), min_count=2)
+        assert False
+    except ValueError:
+        pass
+
+    print('PASSED!')
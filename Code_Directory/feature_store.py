@@ -0,0 +1,208 @@
+# !/usr/bin/env python
+from sentence import *
+from lexicon import *
+import multiprocessing
+import numpy as np
+
+_arcs_cache = dict()
+_arc_rows_cache = dict()
+
+# sentences and features shared with the forked extraction workers
+_extract_job = None
+
+
+def arcs(sentence_len):
+    """return heads, modifiers arrays of all arcs of a full graph, in features extraction order"""
+    if sentence_len not in _arcs_cache:
+        heads = []
+        mods = []
+        for h in range(sentence_len):
+            for m in range(1, sentence_len):
+                if h != m:
+                    heads.append(h)
+                    mods.append(m)
+        _arcs_cache[sentence_len] = np.array(heads, dtype=np.int64), np.array(mods, dtype=np.int64)
+    return _arcs_cache[sentence_len]
+
+
+def arc_rows(sentence_len):
+    """return (sentence_len, sentence_len) matrix of the shifts row of every arc"""
+    if sentence_len not in _arc_rows_cache:
+        heads, mods = arcs(sentence_len)
+        rows = np.full((sentence_len, sentence_len), -1, dtype=np.int64)
+        rows[heads, mods] = np.arange(len(heads))
+        _arc_rows_cache[sentence_len] = rows
+    return _arc_rows_cache[sentence_len]
+
+
+def window_list(features):
+    """return templates sizes list"""
+    return [window for _, window in features(0, 1, Sentence(['', ''], ['', '']))]
+
+
+def sentence_shifts(sentence, features):
+    """return (arcs, templates) array of templates shifts, -1 for a missing feature"""
+    heads, mods = arcs(sentence.sentence_len)
+    shifts = [[shift for shift, _ in features(h, m, sentence)] for h, m in zip(heads.tolist(), mods.tolist())]
+    return np.array(shifts, dtype=np.int32).reshape(len(heads), -1)
+
+
+def _extract_shard(bounds):
+    """worker - extract shifts of sentences [start, end) into a single array"""
+    sentences, features = _extract_job
+    start, end = bounds
+    return np.concatenate([sentence_shifts(sentence, features) for sentence in sentences[start:end]])
+
+
+def extract_parallel(sentences, features, workers):
+    """extract shifts of all sentences over a process pool, return list of array chunks in sentences order"""
+    global _extract_job
+    shards_num = min(len(sentences), workers * 4)
+    bounds = [(len(sentences) * i // shards_num, len(sentences) * (i + 1) // shards_num) for i in range(shards_num)]
+    _extract_job = sentences, features
+    try:
+        with multiprocessing.get_context('fork').Pool(workers) as pool:
+            return pool.map(_extract_shard, bounds, chunksize=1)
+    finally:
+        _extract_job = None
+
+
+def global_ids(shifts, window_list):
+    """return global weight indices of the shifts array and the mask of found features"""
+    shifts = shifts[:, :len(window_list)]
+    offsets = np.cumsum([0] + window_list[:-1])
+    found = shifts != -1
+    return np.where(found, shifts + offsets, 0), found
+
+
+def dense_keys(ids, window_list, template_offset=0):
+    """return (template, shift) keys of global weight indices, see lexicon.FeatureIndex"""
+    offsets = np.cumsum([0] + window_list)
+    templates = np.searchsorted(offsets, ids, side='right') - 1
+    return (ids - offsets[templates]) * TEMPLATES_RADIX + templates + template_offset
+
+
+class DenseLayout:
+    """contiguous weights layout, one block per template in templates order"""
+
+    def __init__(self, window_list):
+        """init layout of a templates prefix sizes list"""
+        self.window_list = window_list
+
+    def size(self):
+        """return weights vector length"""
+        return sum(self.window_list)
+
+    def ids(self, shifts):
+        """return weight indices of the shifts array and the mask of found features"""
+        return global_ids(shifts, self.window_list)
+
+
+def arc_scores(w, shifts, layout):
+    """
+    score every arc with the templates of 'layout'
+    :param w: weights of a model built on 'layout'
+    :param shifts: (arcs, templates) shifts array, may hold more templates than the model
+    :return: scores array, one score per arc
+    """
+    ids, found = layout.ids(shifts)
+    return (w[ids] * found).sum(axis=1)
+
+
+def scores_matrix(w, shifts, layout, sentence_len):
+    """return (sentence_len, sentence_len) arc scores matrix"""
+    heads, mods = arcs(sentence_len)
+    arc_scores_array = arc_scores(w, shifts, layout)  # narrow weights are summed in a wider type
+    scores = np.zeros((sentence_len, sentence_len), dtype=arc_scores_array.dtype)
+    scores[heads, mods] = arc_scores_array
+    return scores
+
+
+class FeatureStore:
+    """templates shifts of every arc of every sentence, stored in one array"""
+
+    def __init__(self, sentences, features, workers=1, unique=False):
+        """
+        extract features of all sentences, over 'workers' processes
+        :param unique: extract every distinct sentence once, repeated sentences share its shifts
+        """
+        self.window_list = window_list(features)
+        self.sentence_lens = np.array([sentence.sentence_len for sentence in sentences], dtype=np.int64)
+        self._rows = np.arange(len(sentences), dtype=np.int64)  # sentence -> extracted sentence
+        if unique:
+            first = dict()
+            for idx, sentence in enumerate(sentences):
+                self._rows[idx] = first.setdefault(tuple(sentence._sentence), len(first))
+            extracted = [sentences[idx] for idx in np.unique(self._rows, return_index=True)[1]]
+        else:
+            extracted = sentences
+        if workers > 1 and len(extracted) > 1:
+            chunks = extract_parallel(extracted, features, workers)
+        else:
+            chunks = [sentence_shifts(sentence, features) for sentence in extracted]
+        self.shifts = np.concatenate(chunks) if chunks else np.zeros((0, len(self.window_list)), dtype=np.int32)
+        self.extracted_lens = np.array([sentence.sentence_len for sentence in extracted], dtype=np.int64)
+        self.arc_offsets = np.concatenate([[0], np.cumsum((self.extracted_lens - 1) ** 2)]).astype(np.int64)
+
+    def __len__(self):
+        """return number of sentences"""
+        return len(self.sentence_lens)
+
+    def __getitem__(self, idx):
+        """return shifts array of sentence 'idx'"""
+        row = self._rows[idx]
+        return self.shifts[self.arc_offsets[row]:self.arc_offsets[row + 1]]
+
+    def scores_matrix(self, w, idx, layout=None):
+        """return arc scores matrix of sentence 'idx', default layout covers all stored templates"""
+        if layout is None:
+            layout = DenseLayout(self.window_list)
+        return scores_matrix(w, self[idx], layout, int(self.sentence_lens[idx]))
+
+
+if __name__ == '__main__':
+    from features import *
+
+    vocab_list = ['ofir', 'tomer', 'nadav', 'roy']
+    pos_list = ['S', 'T']
+    word_pos_pairs = [('ofir', 'S'), ('tomer', 'S'), ('nadav', 'T'), ('roy', 'T')]
+    basic = BasicFeatures(vocab_list, pos_list, word_pos_pairs)
+    complex = ComplexFeatures(vocab_list, pos_list, word_pos_pairs)
+    sentences = [Sentence(['ofir', 'roy'], ['S', 'T']), Sentence(['tomer', 'nadav', 'test'], ['S', 'T', 'S'])]
+
+    # validate arcs order
+    heads, mods = arcs(3)
+    assert list(zip(heads, mods)) == [(0, 1), (0, 2), (1, 2), (2, 1)]
+
+    # validate store layout
+    store = FeatureStore(sentences, complex)
+    assert len(store) == 2
+    assert store.window_list == window_list(complex)
+    assert store[0].shape == (4, complex.features_num())
+    assert store[1].shape == (9, store.shifts.shape[1])
+    assert [shift for shift, _ in complex(2, 1, sentences[0])] == store[0][3].tolist()
+
+    # validate repeated sentences are extracted once
+    unique_store = FeatureStore(sentences + [sentences[1], Sentence(['ofir', 'roy'], ['S', 'T'])], complex, unique=True)
+    assert len(unique_store) == 4 and len(unique_store.shifts) == len(store.shifts)
+    assert (unique_store[2] == store[1]).all() and (unique_store[3] == store[0]).all()
+
+    # validate arc rows
+    assert arc_rows(3)[2, 1] == 3 and arc_rows(3)[1, 2] == 2 and arc_rows(3)[1, 0] == -1
+
+    # validate parallel extraction
+    parallel_store = FeatureStore(sentences * 5, complex, workers=3)
+    assert (parallel_store.shifts == np.concatenate([store.shifts] * 5)).all()
+    assert (parallel_store[7] == store[1]).all()
+
+    # validate scores - a basic model scored over the complex store
+    basic_windows = window_list(basic)
+    assert store.window_list[:len(basic_windows)] == basic_windows
+    w = np.arange(basic.features_len())
+    scores = store.scores_matrix(w, 1, DenseLayout(basic_windows))
+    offsets = np.cumsum([0] + basic_windows[:-1])
+    for h, m in [(0, 1), (3, 2), (1, 3)]:
+        assert scores[h, m] == sum(w[offset + shift] for offset, (shift, _) in zip(offsets, basic(h, m, sentences[1]))
+                                   if shift != -1)
+
+    print('PASSED!')
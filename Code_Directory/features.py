@@ -1,18 +1,27 @@
 # !/usr/bin/env python
 from sentence import *
+from lexicon import *
+import numpy as np
 
 class Feature:
     """base feature class"""
 
     def __init__(self, vocab_list, pos_list, word_pos_pairs):
-        """store vocab, pos, word-pos lists and generate index dictionaries"""
+        """store vocab, pos, word-pos lists and generate append-only index dictionaries"""
         self._vocab_list = vocab_list
         self._pos_list = pos_list
         self._word_pos_pairs = word_pos_pairs
-        self._word_idx = {word: idx for idx, word in enumerate(self._vocab_list)}
-        self._pos_idx = {pos: idx for idx, pos in enumerate(self._pos_list)}
-        self._word_pos_pairs_idx = {(word, pos): idx for idx, (word, pos) in enumerate(self._word_pos_pairs)}
-        self._word_pos_5gram_pairs_idx = {(word[:5], pos): idx for idx, (word, pos) in enumerate(self._word_pos_pairs)}
+        self._word_idx = Lexicon(self._vocab_list)
+        self._pos_idx = Lexicon(self._pos_list)
+        self._word_pos_pairs_idx = Lexicon(self._word_pos_pairs)
+        self._word_pos_5gram_pairs_idx = Lexicon((word[:5], pos) for word, pos in self._word_pos_pairs)
+
+    def extend(self, word_pos_pairs):
+        """append unseen words and word-pos pairs, ids of known ones never change (pos tags set is closed)"""
+        for word, pos in word_pos_pairs:
+            self._word_idx.add(word)
+            self._word_pos_pairs_idx.add((word, pos))
+            self._word_pos_5gram_pairs_idx.add((word[:5], pos))
 
 
 class WordPos5gram(Feature):
@@ -34,7 +43,7 @@ class WordPos(Feature):
 
     def __call__(self, word, pos):
         """generate feature tuple"""
-        return self._word_pos_pairs_idx.get((word, pos), -1), len(self._word_pos_pairs)
+        return self._word_pos_pairs_idx.get((word, pos), -1), len(self._word_pos_pairs_idx)
 
 
 class Word(Feature):
@@ -71,7 +80,8 @@ class WordPosPos(Feature):
         word_pos_idx = self._word_pos_pairs_idx.get((word, pos), -1)
         if other_pos_idx == -1 or word_pos_idx == -1:
             return -1, len(self._word_pos_pairs_idx) * len(self._pos_idx)
-        return other_pos_idx * len(self._word_pos_pairs_idx) + word_pos_idx, len(self._word_pos_pairs_idx) * len(self._pos_idx)
+        # growing word-pos index is the most significant digit, so shifts don't move when pairs are appended
+        return word_pos_idx * len(self._pos_idx) + other_pos_idx, len(self._word_pos_pairs_idx) * len(self._pos_idx)
 
 
 class PosPos(Feature):
@@ -168,6 +178,16 @@ class BasicFeatures:
         self._f_word_pos_pos = WordPosPos(vocab_list, pos_list, word_pos_pairs)
         self._f_pos_pos = PosPos(vocab_list, pos_list, word_pos_pairs)
 
+    def templates(self):
+        """return all feature templates objects"""
+        return [f for f in vars(self).values() if isinstance(f, Feature)]
+
+    def extend(self, sentences):
+        """append the words and word-pos pairs of new sentences to all templates"""
+        word_pos_pairs = [sentence(idx) for sentence in sentences for idx in range(1, sentence.sentence_len)]
+        for template in self.templates():
+            template.extend(word_pos_pairs)
+
     def features_num(self):
         """return the number of features"""
         return len(self(0, 0, Sentence(['', ''], ['', ''])))
@@ -181,6 +201,15 @@ class BasicFeatures:
         return sum
 
 
+    def template_names(self):
+        """return templates names, in features order"""
+        return ['p_word_p_pos', 'p_word', 'p_pos', 'c_word_c_pos', 'c_word', 'c_pos', 'c_word_c_pos_p_pos',
+                'p_word_p_pos_c_pos', 'p_pos_c_pos']
+
+    def affected(self, heads, mods, position, pos_changed):
+        """return mask of the arcs (heads, mods arrays) whose features read the word or pos at 'position'"""
+        return (heads == position) | (mods == position)
+
     def __call__(self, h, m, sentence):
         """return list of all features"""
         p_word = sentence(h)[0]
@@ -212,6 +241,21 @@ class ComplexFeatures(BasicFeatures):
         self._f_between_pos = BetweenPos(vocab_list, pos_list, word_pos_pairs)
         self._f_5gram = WordPos5gram(vocab_list, pos_list, word_pos_pairs)
 
+    def template_names(self):
+        """return templates names, in features order"""
+        return super(ComplexFeatures, self).template_names() + [
+            'p_5gram', 'c_5gram', 'p_pos-1', 'p_pos+1', 'c_pos-1', 'c_pos+1', 'p_pos_p_pos+1_c_pos-1_c_pos',
+            'p_pos-1_p_pos_c_pos-1_c_pos', 'p_pos_p_pos+1_c_pos_c_pos+1', 'p_pos-1_p_pos_c_pos_c_pos+1', 'distance',
+            'direction'] + ['between_' + pos for pos in self._f_between_pos._pos_list]
+
+    def affected(self, heads, mods, position, pos_changed):
+        """neighbor pos and between pos templates also read the pos of positions next to and inside the arc"""
+        mask = super(ComplexFeatures, self).affected(heads, mods, position, pos_changed)
+        if pos_changed:
+            mask |= (abs(heads - position) == 1) | (abs(mods - position) == 1)
+            mask |= (np.minimum(heads, mods) < position) & (position < np.maximum(heads, mods))
+        return mask
+
     def __call__(self, h, m, sentence):
         """return list of all features"""
         basic_features = super(ComplexFeatures, self).__call__(h, m, sentence)
@@ -289,12 +333,12 @@ if __name__ == '__main__':
     # validate word pos pos
     word_pos_pos = WordPosPos(vocab_list, pos_list, word_pos_pairs)
     assert word_pos_pos('ofir', 'S', 'S') == (0, 8)
-    assert word_pos_pos('tomer', 'S', 'S') == (1,8)
-    assert word_pos_pos('nadav', 'T', 'S') == (2,8)
-    assert word_pos_pos('roy', 'T','S') == (3,8)
-    assert word_pos_pos('ofir', 'S', 'T') == (4, 8)
-    assert word_pos_pos('tomer', 'S', 'T') == (5, 8)
-    assert word_pos_pos('nadav', 'T', 'T') == (6, 8)
+    assert word_pos_pos('tomer', 'S', 'S') == (2,8)
+    assert word_pos_pos('nadav', 'T', 'S') == (4,8)
+    assert word_pos_pos('roy', 'T','S') == (6,8)
+    assert word_pos_pos('ofir', 'S', 'T') == (1, 8)
+    assert word_pos_pos('tomer', 'S', 'T') == (3, 8)
+    assert word_pos_pos('nadav', 'T', 'T') == (5, 8)
     assert word_pos_pos('roy', 'T','T') == (7, 8)
     assert word_pos_pos('test', 'S', 'S') == (-1, 8)
     assert word_pos_pos('roy', 'F', 'S') == (-1, 8)
@@ -345,10 +389,32 @@ if __name__ == '__main__':
     assert dist(9, 6) == (3, 5)
     assert dist(5, 10) == (-1, 5)
 
+    # validate extend - known ids are stable, new ones are appended
+    basic = BasicFeatures(vocab_list, pos_list, word_pos_pairs)
+    sentence = Sentence(['alejandro', 'ofir'], ['S', 'S'])
+    before = basic(1, 2, sentence)
+    basic.extend([sentence])
+    after = basic(1, 2, sentence)
+    assert after[3] == (0, 5) and before[3] == (0, 4)
+    assert after[0] == (4, 5) and after[1] == (4, 5) and after[6] == (0, 10) and after[7] == (8, 10)
+    assert len(basic.templates()) == 5
+
+    # validate 5 gram
+    word_pos_5gram = WordPos5gram(vocab_list, pos_list, word_pos_pairs + [('ofirr', 'S')])
+    assert word_pos_5gram('ofir', 'S') == (0, 5)
+    assert word_pos_5gram('ofirrr', 'S') == (4, 5)
+    assert word_pos_5gram('ofirr', 'T') == (-1, 5)
+
     # validate between pos
     between_pos = BetweenPos(vocab_list, pos_list, word_pos_pairs)
     sentence = Sentence(['ofir', 'roy','tomer'], ['S', 'T', 'S'])
     assert between_pos(1, 3, sentence) == [(-1, 1), (0, 1)]
     assert between_pos(0, 3, sentence) == [(0, 1), (0, 1)]
 
+    # validate templates names
+    complex = ComplexFeatures(vocab_list, pos_list, word_pos_pairs)
+    assert len(basic.template_names()) == basic.features_num()
+    assert len(complex.template_names()) == complex.features_num()
+    assert complex.template_names()[-2:] == ['between_S', 'between_T']
+
     print('PASSED!')
@@ -0,0 +1,117 @@
+# !/usr/bin/env python
+from perceptron import *
+from collections import namedtuple
+
+# sentence, (sentence_len, sentence_len) arc scores with the best relation score, best relation index matrix or None
+ScoredSentence = namedtuple('ScoredSentence', ['sentence', 'scores', 'labels'])
+
+
+def score_arcs(w, sentence, features, layout, labeler, rows):
+    """
+    extract and score the arcs 'rows' of a sentence
+    :return: arc scores (with the best relation score) and best relation indices (None without labeler) arrays
+    """
+    heads, mods = arcs(sentence.sentence_len)
+    shifts = np.array([[shift for shift, _ in features(h, m, sentence)]
+                       for h, m in zip(heads[rows].tolist(), mods[rows].tolist())], dtype=np.int32)
+    shifts = shifts.reshape(len(rows), -1)
+    scores = arc_scores(w, shifts, layout)
+    if labeler is None:
+        return scores, None
+    relation_scores = labeler.relation_scores(w, shifts, sentence.sentence_len, rows)
+    return scores + relation_scores.max(axis=1), relation_scores.argmax(axis=1)
+
+
+def score_sentence(w, sentence, features, layout, labeler=None):
+    """score all arcs of a sentence, return ScoredSentence"""
+    heads, mods = arcs(sentence.sentence_len)
+    scores, labels = score_arcs(w, sentence, features, layout, labeler, np.arange(len(heads)))
+    scores_matrix = np.zeros((sentence.sentence_len, sentence.sentence_len), dtype=scores.dtype)
+    scores_matrix[heads, mods] = scores
+    labels_matrix = None
+    if labeler is not None:
+        labels_matrix = np.zeros((sentence.sentence_len, sentence.sentence_len), dtype=np.int64)
+        labels_matrix[heads, mods] = labels
+    return ScoredSentence(sentence, scores_matrix, labels_matrix)
+
+
+def affected_rows(features, sentence, edited):
+    """return rows of the arcs whose features read a position edited between 'sentence' and 'edited'"""
+    heads, mods = arcs(sentence.sentence_len)
+    mask = np.zeros(len(heads), dtype=bool)
+    for position in range(1, sentence.sentence_len):
+        if sentence(position) != edited(position):
+            mask |= features.affected(heads, mods, position, sentence(position)[1] != edited(position)[1])
+    return np.flatnonzero(mask)
+
+
+def rescore(w, scored, edited, features, layout, labeler=None):
+    """
+    score an edited sentence, only the arcs whose features read an edited position are re-extracted
+    :param scored: ScoredSentence of the sentence before the edit
+    :param edited: the sentence after the edit, same length (other edits are scored from scratch)
+    :return: ScoredSentence of the edited sentence, number of rescored arcs
+    """
+    if edited.sentence_len != scored.sentence.sentence_len:
+        return score_sentence(w, edited, features, layout, labeler), len(arcs(edited.sentence_len)[0])
+    rows = affected_rows(features, scored.sentence, edited)
+    scores_matrix = scored.scores.copy()
+    labels_matrix = scored.labels.copy() if scored.labels is not None else None
+    if len(rows):
+        heads, mods = arcs(edited.sentence_len)
+        scores, labels = score_arcs(w, edited, features, layout, labeler, rows)
+        scores_matrix[heads[rows], mods[rows]] = scores
+        if labels_matrix is not None:
+            labels_matrix[heads[rows], mods[rows]] = labels
+    return ScoredSentence(edited, scores_matrix, labels_matrix), len(rows)
+
+
+def decode_scored(scored):
+    """decode a ScoredSentence, return parents dictionary and relation index dictionary (None without labels)"""
+    parents = mst_decode(scored.scores)
+    if scored.labels is None:
+        return parents, None
+    return parents, {m: int(scored.labels[h, m]) for m, h in parents.items()}
+
+
+if __name__ == '__main__':
+    from features import *
+
+    vocab_list = ['ofir', 'tomer', 'nadav', 'roy']
+    pos_list = ['S', 'T']
+    word_pos_pairs = [('ofir', 'S'), ('tomer', 'S'), ('nadav', 'T'), ('roy', 'T')]
+    complex = ComplexFeatures(vocab_list, pos_list, word_pos_pairs)
+    basic = BasicFeatures(vocab_list, pos_list, word_pos_pairs)
+    labeler = Labeler(['NMOD', 'P', 'ROOT'], window_list(complex))
+    w = np.random.RandomState(0).randint(-5, 5, complex.features_len() + labeler.weights_len())
+    layout = DenseLayout(window_list(complex))
+    sentence = Sentence(['ofir', 'roy', 'tomer', 'nadav', 'roy', 'ofir'], ['S', 'T', 'S', 'T', 'T', 'S'])
+
+    # validate full scoring against the joint decoding
+    scored = score_sentence(w, sentence, complex, layout, labeler)
+    assert decode_scored(scored) == labeled_decode(w, sentence_shifts(sentence, complex), layout,
+                                                   sentence.sentence_len, labeler)
+
+    # validate incremental scores equal scoring the edited sentence from scratch
+    for words, tags in [(['ofir', 'roy', 'nadav', 'nadav', 'roy', 'ofir'], ['S', 'T', 'S', 'T', 'T', 'S']),
+                        (['ofir', 'roy', 'tomer', 'nadav', 'roy', 'ofir'], ['S', 'T', 'S', 'S', 'T', 'S']),
+                        (['tomer', 'roy', 'tomer', 'nadav', 'roy', 'roy'], ['T', 'T', 'S', 'T', 'T', 'T'])]:
+        edited = Sentence(words, tags)
+        rescored, rescored_num = rescore(w, scored, edited, complex, layout, labeler)
+        full = score_sentence(w, edited, complex, layout, labeler)
+        assert (rescored.scores == full.scores).all() and (rescored.labels == full.labels).all()
+        assert decode_scored(rescored) == decode_scored(full)
+        assert rescored_num < len(arcs(edited.sentence_len)[0])
+
+    # a word only edit rescores the arcs of the word, a pos edit also its neighbors and the spans over it
+    edited = Sentence(['ofir', 'roy', 'nadav', 'nadav', 'roy', 'ofir'], ['S', 'T', 'S', 'T', 'T', 'S'])
+    assert len(affected_rows(complex, sentence, edited)) == 2 * 6 - 1
+    edited = Sentence(['ofir', 'roy', 'tomer', 'nadav', 'roy', 'ofir'], ['S', 'T', 'S', 'T', 'T', 'T'])
+    assert len(affected_rows(basic, sentence, edited)) < len(affected_rows(complex, sentence, edited))
+
+    # other edits are scored from scratch
+    edited = Sentence(['ofir', 'roy'], ['S', 'T'])
+    rescored, rescored_num = rescore(w, scored, edited, complex, layout, labeler)
+    assert rescored_num == 4 and (rescored.scores == score_sentence(w, edited, complex, layout, labeler).scores).all()
+
+    print('PASSED!')
@@ -0,0 +1,173 @@
+# !/usr/bin/env python
+from feature_store import *
+from lexicon import *
+import numpy as np
+
+# arc templates reused for relation scoring:
+# p_word_p_pos, p_pos, c_word_c_pos, c_word, c_pos, p_pos_c_pos (BasicFeatures order)
+LABEL_TEMPLATES = [0, 2, 3, 4, 5, 8]
+
+
+class Labeler:
+    """
+    joint dependency relation scorer
+    every (arc feature, relation) pair has a weight, laid after the arc weights in the weights vector,
+    or placed by a FeatureIndex shared with the arc features
+    """
+
+    def __init__(self, relation_list, window_list, templates=LABEL_TEMPLATES, index=None):
+        """
+        :param relation_list: dependency relations list
+        :param window_list: arc templates sizes list, relation weights start after them
+        :param templates: indices of the arc templates used for relation scoring
+        :param index: optional FeatureIndex, relation features are keyed after the arc templates
+        """
+        self.relation_list = relation_list
+        self._relation_idx = {relation: idx for idx, relation in enumerate(relation_list)}
+        self._templates = list(templates)
+        self._window_list = [window_list[t] for t in self._templates] + [2]  # + arc direction
+        self._features_len = sum(self._window_list)
+        self._offset = sum(window_list)
+        self._arc_templates_num = len(window_list)
+        self._index = index
+
+    def weights_len(self):
+        """return the number of relation weights (indexed weights are counted by the index)"""
+        if self._index is not None:
+            return 0
+        return self._features_len * len(self.relation_list)
+
+    def features_num(self, seen):
+        """return number of relation features of arcs whose templates have 'seen' distinct ids each"""
+        return sum(seen[t] for t in self._templates) + 2  # + arc direction
+
+    def relation_items(self):
+        """return (template, shift) keys and weights base indices of all relation features"""
+        if self._index is not None:
+            return self._index.items(self._arc_templates_num)
+        ids = np.arange(self._features_len, dtype=np.int64)
+        return dense_keys(ids, self._window_list, self._arc_templates_num), self._offset + ids * len(self.relation_list)
+
+    def reindexed(self, index):
+        """return this labeler over another FeatureIndex holding its relation features"""
+        return Labeler(self.relation_list, [0] * self._arc_templates_num, self._templates, index)
+
+    def relation_ids(self, relations):
+        """map modifier -> relation dictionary to modifier -> relation index, -1 for an unknown relation"""
+        return {m: self._relation_idx.get(relation, -1) for m, relation in relations.items()}
+
+    def relations(self, relation_ids):
+        """map modifier -> relation index dictionary to modifier -> relation"""
+        return {m: self.relation_list[idx] for m, idx in relation_ids.items()}
+
+    def label_shifts(self, shifts, sentence_len, rows=None):
+        """return (arcs, relation templates) shifts array, 'shifts' holds only the arcs 'rows' if given"""
+        heads, mods = arcs(sentence_len)
+        if rows is not None:
+            heads, mods = heads[rows], mods[rows]
+        return np.column_stack([shifts[:, self._templates], heads < mods])
+
+    def label_ids(self, shifts, sentence_len, rows=None):
+        """
+        return relation features base indices (arcs, relation templates) and found mask,
+        the weight of relation r is at base index + r
+        """
+        label_shifts = self.label_shifts(shifts, sentence_len, rows)
+        if self._index is not None:
+            return self._index.ids(label_shifts, self._arc_templates_num)
+        ids, found = global_ids(label_shifts, self._window_list)
+        return self._offset + ids * len(self.relation_list), found
+
+    def index_features(self, shifts, sentence_len):
+        """add the relation features of all arcs of a sentence to the index"""
+        self._index.add(self.label_shifts(shifts, sentence_len), self._arc_templates_num, len(self.relation_list))
+
+    def index_gold_features(self, label_shifts, min_count=1):
+        """
+        add the relation features of gold arcs to the index
+        :param label_shifts: label shifts of the gold arcs of all sentences
+        :param min_count: minimum number of gold arcs of a feature, int or per arc template list
+        """
+        min_counts = np.broadcast_to(np.asarray(min_count, dtype=np.int64), (self._arc_templates_num,))
+        min_counts = list(min_counts[self._templates]) + [1]  # + arc direction
+        self._index.add(label_shifts, self._arc_templates_num, len(self.relation_list), min_counts)
+
+    def relation_scores(self, w, shifts, sentence_len, rows=None):
+        """return (arcs, relations) scores of every relation of every arc, 'shifts' holds only the arcs 'rows' if given"""
+        ids, found = self.label_ids(shifts, sentence_len, rows)
+        relations = np.arange(len(self.relation_list))
+        return (w[ids[:, :, None] + relations] * found[:, :, None]).sum(axis=1)  # narrow weights are widened
+
+    def scores_tensor(self, w, shifts, sentence_len):
+        """return (sentence_len, sentence_len, relations) scores of every relation of every arc"""
+        scores = self.relation_scores(w, shifts, sentence_len)
+        heads, mods = arcs(sentence_len)
+        tensor = np.zeros((sentence_len, sentence_len, len(self.relation_list)), dtype=scores.dtype)
+        tensor[heads, mods] = scores
+        return tensor
+
+    def best_relations(self, w, shifts, sentence_len):
+        """return best relation score and best relation index of every arc, as (sentence_len, sentence_len) matrices"""
+        tensor = self.scores_tensor(w, shifts, sentence_len)
+        return tensor.max(axis=2), tensor.argmax(axis=2)
+
+    def weight_ids(self, shifts, sentence_len, rows, relation_ids):
+        """return weights vector indices of the relation features of arcs 'rows' labeled 'relation_ids'"""
+        ids, found = self.label_ids(shifts, sentence_len)
+        ids = ids[rows] + np.asarray(relation_ids, dtype=np.int64)[:, None]
+        return ids[found[rows]]
+
+    def feature_ids(self, shifts, sentence_len):
+        """return all relation weights indices the arcs of a sentence may use"""
+        ids, found = self.label_ids(shifts, sentence_len)
+        return (np.unique(ids[found])[:, None] + np.arange(len(self.relation_list))).ravel()
+
+
+if __name__ == '__main__':
+    from features import *
+
+    vocab_list = ['ofir', 'tomer', 'nadav', 'roy']
+    pos_list = ['S', 'T']
+    word_pos_pairs = [('ofir', 'S'), ('tomer', 'S'), ('nadav', 'T'), ('roy', 'T')]
+    basic = BasicFeatures(vocab_list, pos_list, word_pos_pairs)
+    sentence = Sentence(['ofir', 'roy', 'tomer'], ['S', 'T', 'S'])
+    shifts = sentence_shifts(sentence, basic)
+
+    labeler = Labeler(['NMOD', 'P', 'ROOT'], window_list(basic))
+    assert labeler.weights_len() == (4 + 2 + 4 + 4 + 2 + 4 + 2) * 3
+    assert labeler.relation_ids({1: 'ROOT', 2: 'P', 3: 'X'}) == {1: 2, 2: 1, 3: -1}
+    assert labeler.relations({1: 2, 2: 1}) == {1: 'ROOT', 2: 'P'}
+
+    # validate tensor against a per arc, per relation sum
+    w = np.random.RandomState(0).randint(-5, 5, basic.features_len() + labeler.weights_len())
+    tensor = labeler.scores_tensor(w, shifts, sentence.sentence_len)
+    rows = arc_rows(sentence.sentence_len)
+    for h, m in [(0, 1), (2, 1), (3, 2), (1, 3)]:
+        for relation in range(3):
+            ids = labeler.weight_ids(shifts, sentence.sentence_len, [rows[h, m]], [relation])
+            assert tensor[h, m, relation] == w[ids].sum()
+    best_scores, best_labels = labeler.best_relations(w, shifts, sentence.sentence_len)
+    assert best_scores[2, 1] == tensor[2, 1].max() and best_labels[2, 1] == tensor[2, 1].argmax()
+    assert set(labeler.weight_ids(shifts, 4, [0], [1])) <= set(labeler.feature_ids(shifts, 4))
+
+    # validate indexed relation weights
+    index = FeatureIndex()
+    index.add(shifts)
+    labeler = Labeler(['NMOD', 'P', 'ROOT'], window_list(basic), index=index)
+    labeler.index_features(shifts, sentence.sentence_len)
+    assert labeler.weights_len() == 0
+    w = np.random.RandomState(0).randint(-5, 5, index.size())
+    tensor = labeler.scores_tensor(w, shifts, sentence.sentence_len)
+    ids = labeler.weight_ids(shifts, sentence.sentence_len, [rows[3, 2]], [2])
+    assert len(ids) == 7 and tensor[3, 2, 2] == w[ids].sum() and ids.max() < index.size()
+
+    # validate frequency thresholded relation weights
+    index = FeatureIndex()
+    labeler = Labeler(['NMOD', 'P', 'ROOT'], window_list(basic), index=index)
+    label_shifts = labeler.label_shifts(shifts, sentence.sentence_len)[[rows[2, 1], rows[0, 2], rows[2, 3]]]
+    labeler.index_gold_features(label_shifts, min_count=2)
+    ids, found = labeler.label_ids(shifts, sentence.sentence_len)
+    assert found[rows[2, 1]].tolist() == [True, True, False, False, True, True, True]
+    assert index.size() == 6 * 3
+
+    print('PASSED!')
@@ -0,0 +1,151 @@
+# !/usr/bin/env python
+import numpy as np
+
+# (template, shift) pairs are packed into a single int64 key: shift * TEMPLATES_RADIX + template
+TEMPLATES_RADIX = 1 << 10
+
+
+class Lexicon(dict):
+    """append-only item -> id dictionary, an item id never changes"""
+
+    def __init__(self, items=()):
+        """init lexicon, ids follow items order"""
+        super(Lexicon, self).__init__()
+        for item in items:
+            self.add(item)
+
+    def add(self, item):
+        """return item id, append item if it is new"""
+        if item not in self:
+            self[item] = len(self)
+        return self[item]
+
+
+class FeatureIndex:
+    """
+    append-only (template, shift) -> weight index
+    weights of known features keep their index when new features are added, so the weights vector only grows
+    """
+
+    def __init__(self):
+        """init empty index"""
+        self._keys = np.zeros(0, dtype=np.int64)  # sorted
+        self._ids = np.zeros(0, dtype=np.int64)
+        self._size = 0
+
+    def __len__(self):
+        """return number of indexed features"""
+        return len(self._keys)
+
+    def size(self):
+        """return weights vector length"""
+        return self._size
+
+    @staticmethod
+    def _keys_of(shifts, template_offset):
+        """pack shifts array into (template, shift) keys"""
+        templates = np.arange(shifts.shape[1], dtype=np.int64) + template_offset
+        return shifts.astype(np.int64) * TEMPLATES_RADIX + templates
+
+    def ids(self, shifts, template_offset=0):
+        """
+        :param shifts: (arcs, templates) shifts array
+        :param template_offset: template number of the first column
+        :return: weight indices array and mask of indexed features
+        """
+        found = shifts != -1
+        if len(self._keys) == 0:
+            return np.zeros(shifts.shape, dtype=np.int64), found & False
+        keys = self._keys_of(shifts, template_offset)
+        pos = np.minimum(np.searchsorted(self._keys, keys), len(self._keys) - 1)
+        found &= self._keys[pos] == keys
+        return np.where(found, self._ids[pos], 0), found
+
+    def items(self, first_template=0, last_template=TEMPLATES_RADIX):
+        """return (template, shift) keys and weight indices of the features of templates [first_template, last_template)"""
+        templates = self._keys % TEMPLATES_RADIX
+        mask = (templates >= first_template) & (templates < last_template)
+        return self._keys[mask], self._ids[mask]
+
+    @staticmethod
+    def from_items(keys, ids, size):
+        """return index of (template, shift) keys and their weight indices"""
+        index = FeatureIndex()
+        order = np.argsort(keys, kind='stable')
+        index._keys, index._ids, index._size = keys[order].astype(np.int64), ids[order], size
+        return index
+
+    def add(self, shifts, template_offset=0, width=1, min_count=1):
+        """
+        index all features of a shifts array
+        :param width: number of consecutive weights reserved for every new feature
+        :param min_count: minimum number of occurrences in shifts of a new feature, int or per template list
+        :return: number of new features
+        """
+        keys, counts = np.unique(self._keys_of(shifts, template_offset)[shifts != -1], return_counts=True)
+        min_counts = np.broadcast_to(np.asarray(min_count, dtype=np.int64), (shifts.shape[1],))
+        keys = keys[counts >= min_counts[keys % TEMPLATES_RADIX - template_offset]]
+        if len(self._keys):
+            pos = np.minimum(np.searchsorted(self._keys, keys), len(self._keys) - 1)
+            keys = keys[self._keys[pos] != keys]
+        new_ids = self._size + np.arange(len(keys), dtype=np.int64) * width
+        self._size += len(keys) * width
+        keys = np.concatenate([self._keys, keys])
+        ids = np.concatenate([self._ids, new_ids])
+        order = np.argsort(keys, kind='stable')
+        self._keys, self._ids = keys[order], ids[order]
+        return len(new_ids)
+
+    def grow(self, w):
+        """return weights vector extended with zeros to the index size"""
+        if len(w) >= self._size:
+            return w
+        return np.concatenate([w, np.zeros(self._size - len(w), dtype=w.dtype)])
+
+
+if __name__ == '__main__':
+    # validate lexicon
+    lexicon = Lexicon(['b', 'a'])
+    assert lexicon['b'] == 0 and lexicon['a'] == 1
+    assert lexicon.add('c') == 2 and lexicon.add('b') == 0
+    assert lexicon.get('d', -1) == -1
+
+    # validate feature index
+    index = FeatureIndex()
+    ids, found = index.ids(np.array([[0, 1]]))
+    assert not found.any()
+    assert index.add(np.array([[3, -1], [3, 0]])) == 2
+    ids, found = index.ids(np.array([[3, 0], [0, 5]]))
+    assert found.tolist() == [[True, True], [False, False]]
+    first_ids = ids[0].tolist()
+    assert sorted(first_ids) == [0, 1]
+
+    # append only - known ids don't move
+    assert index.add(np.array([[0, 5], [3, 0]]), width=2) == 2
+    ids, found = index.ids(np.array([[3, 0], [0, 5]]))
+    assert found.all() and ids[0].tolist() == first_ids
+    assert sorted(ids[1].tolist()) == [2, 4] and index.size() == 6
+    assert len(index) == 4
+
+    template_keys, template_ids = index.items(1)
+    assert template_keys.tolist() == [1, 5 * TEMPLATES_RADIX + 1]
+    assert template_ids.tolist() == [first_ids[1], ids[1][1]]
+    copied = FeatureIndex.from_items(*index.items(), size=index.size())
+    assert (copied.ids(np.array([[0, 5]]))[0] == index.ids(np.array([[0, 5]]))[0]).all()
+
+    # template offset separates equal shifts of different templates
+    ids, found = index.ids(np.array([[3, 0]]), template_offset=1)
+    assert found.tolist() == [[False, False]]
+
+    # validate per template minimum counts
+    frequent = FeatureIndex()
+    assert frequent.add(np.array([[1, 7], [1, 8], [2, 7], [-1, 7]]), min_count=[2, 3]) == 2
+    ids, found = frequent.ids(np.array([[1, 7], [2, 8]]))
+    assert found.tolist() == [[True, True], [False, False]]
+    assert frequent.add(np.array([[2, 8]]), min_count=2) == 0
+
+    # validate grow
+    w = index.grow(np.ones(2, dtype=int))
+    assert w.tolist() == [1, 1, 0, 0, 0, 0]
+
+    print('PASSED!')
@@ -2,23 +2,21 @@
 from data import *
 from perceptron import *
 from features import *
+from checkpoint import *
+from corpus import *
+from parse_cache import *
+from compact import *
+from feature_report import *
+from transition import *
 import argparse
 import pickle
+import sys
 import time
 
 
-def evaluate(labeled_data, w, perceptron):
+def evaluate(labeled_data, w, perceptron, cache=None):
     """evaluate model accuracy per word"""
-    total = 0
-    correct = 0
-    for idx, sentence in enumerate(labeled_data.sentences):
-        ground_truth = sentence.dependency_tree()
-        predicted = perceptron.sentence_inference(w, sentence.sentence_len, perceptron._f_dict_list[idx])
-        for x in range(1, sentence.sentence_len):
-            total += 1
-            if predicted[x] == ground_truth[x]:
-                correct += 1
-    return correct / total
+    return perceptron.accuracy(w, cache)
 
 
 if __name__ == '__main__':
@@ -29,50 +27,167 @@ if __name__ == '__main__':
     parser.add_argument("--N", help="number of iterations", default=1)
     parser.add_argument("--features", help="features type basic/complex", default='basic')
     parser.add_argument("--train_data", help="path to training data", default='train.labeled')
+    parser.add_argument("--workers", help="number of features extraction processes", default=1)
+    parser.add_argument("--active", help="revisit sentences parsed correctly at an exponentially lower rate",
+                        action='store_true')
+    parser.add_argument("--max_skip", help="max epochs between decodes of a correct sentence, 1 skips only "
+                                           "sentences none of whose features changed (rare)", default=4)
+    parser.add_argument("--checkpoint_dir", help="save a checkpoint after every epoch to this directory")
+    parser.add_argument("--resume", help="resume training from the last checkpoint", action='store_true')
+    parser.add_argument("--labeled", help="labeled parsing, predict dependency relations", action='store_true')
+    parser.add_argument("--stable", help="stable feature ids, the model can be updated with new data", action='store_true')
+    parser.add_argument("--min_count", help="stable model of gold arc features seen at least k times, "
+                                            "k or comma separated k per template, only these are kept per arc")
+    parser.add_argument("--update", help="continue training a stable model on the training data, saved in place")
+    parser.add_argument("--dev_data", help="labeled dev data, evaluated after every epoch, best epoch is kept")
+    parser.add_argument("--export", help="export the model without zero weights to this file, test on the export")
+    parser.add_argument("--bits", help="quantize exported weights to this number of bits")
+    parser.add_argument("--report", help="print the per template memory report of the training data (and weights)",
+                        action='store_true')
+    parser.add_argument("--cache", help="parse results cache file of the test evaluation, reused across runs "
+                                        "(repeated test sentences are always extracted once)")
+    parser.add_argument("--binary", help="load data files from their memory-mapped binary corpus", action='store_true')
+    parser.add_argument("--transition", help="linear time transition based (arc-standard) parser, unlabeled",
+                        action='store_true')
     args = parser.parse_args()
 
     N = int(args.N)
+    workers = int(args.workers)
     features_type = args.features
+    model = None
+    if args.update or args.weights:  # stable and exported models are dictionaries, plain weights are an array
+        model = pickle.load(open(args.update or args.weights, 'rb'))
+        if args.update and not isinstance(model, dict):
+            parser.error('--update needs a model trained with --stable, %s holds plain weights' % args.update)
+    labeled = args.labeled or bool(args.weights and 'labeled' in args.weights)
+    stable = args.stable or bool(args.update) or isinstance(model, dict)
+    transition = args.transition or (isinstance(model, dict) and bool(model.get('transition')))
+    if transition:  # configuration features are always indexed
+        labeled, stable = False, True
+    min_count = None
+    if args.min_count:  # thresholded features are indexed
+        min_count = [int(k) for k in args.min_count.split(',')]
+        min_count = min_count[0] if len(min_count) == 1 else min_count
+        stable = True
 
     # init train
-    train_data = Data(args.train_data, is_labeled=True)
-    if (args.weights and 'basic' in args.weights) or (not args.weights and features_type == 'basic'):
-        train_features = BasicFeatures(train_data.vocab_list, train_data.pos_list, train_data.word_pos_pairs)
+    train_data = load_data(args.train_data, True, args.binary)
+    if isinstance(model, dict):  # stable models carry their features, index and labeler
+        train_features, index, labeler = model['features'], model['index'], model.get('labeler')
+        features_type = 'basic' if type(train_features) is BasicFeatures else 'complex'
+        labeled = labeler is not None
     else:
-        train_features = ComplexFeatures(train_data.vocab_list, train_data.pos_list, train_data.word_pos_pairs)
+        if (args.weights and 'basic' in args.weights) or (not args.weights and features_type == 'basic'):
+            train_features = BasicFeatures(train_data.vocab_list, train_data.pos_list, train_data.word_pos_pairs)
+        else:
+            train_features = ComplexFeatures(train_data.vocab_list, train_data.pos_list, train_data.word_pos_pairs)
+        index = FeatureIndex() if stable else None
+        labeler = Labeler(train_data.relation_list, window_list(train_features), index=index) if labeled else None
+    model_name = features_type + ('_labeled' if labeled else '') + ('_stable' if stable else '')
+    if transition:
+        model_name = features_type + '_transition'
+    if min_count is not None:
+        model_name += '_min' + args.min_count.replace(',', '-')
+
+    if args.report:  # memory planning, nothing is trained
+        report_w = None
+        if args.weights:
+            report_w = model['w'] if isinstance(model, dict) else model
+        print(format_report(template_report(train_features, train_data.sentences, w=report_w, index=index,
+                                            labeler=labeler, min_count=min_count)))
+        sys.exit()
+
+    if transition:  # train (or load) and evaluate the transition based parser
+        if args.weights:
+            train_w = model['w']
+        else:
+            if args.update:
+                train_features.extend(train_data.sentences)
+            start = time.time()
+            print('extract train configurations')
+            train_perceptron = TransitionPerceptron(train_data, train_features, index, grow_index=True)
+            print('extract ended', time.time() - start)
+            start = time.time()
+            print('learn model weights')
+            train_w = train_perceptron.train(N, model['w'] if args.update else None)
+            print('learning ended: ', time.time() - start)
+            print('train accuracy: ', train_perceptron.accuracy(train_w))
+            model = {'features': train_features, 'index': index, 'transition': True, 'w': train_w}
+            pickle.dump(model, open(args.update or 'cache/' + model_name + '_N' + str(N) + '.pickle', 'wb'))
+        start = time.time()
+        print('test evaluation')
+        test_data = load_data('test.labeled', True, args.binary)
+        print('test accuracy: ', TransitionPerceptron(test_data, train_features, index).accuracy(train_w))
+        print('evaluation ended: ', time.time() - start)
+        sys.exit()
 
     if args.weights:  # load trained weights
-        train_w = pickle.load(open(args.weights, 'rb'))
+        train_w = model['w'] if isinstance(model, dict) else model
     else:
+        if args.update:  # append the new words, known feature ids don't change
+            train_features.extend(train_data.sentences)
         # init train
         start = time.time()
         print('extract train features')
-        train_perceptron = Perceptron(train_data, train_features)
+        train_perceptron = Perceptron(train_data, train_features, workers, labeler, index, stable, min_count,
+                                      prune=min_count is not None)
         print('extract ended', time.time() - start)
 
         # learn train weights
         start = time.time()
         print('learn model weights')
-        train_w = train_perceptron.train(N)
+        scheduler = train_perceptron.scheduler(int(args.max_skip)) if args.active else None
+        checkpoint = None
+        if args.checkpoint_dir:
+            checkpoint = Checkpoint(args.checkpoint_dir, model_name)
+            if not args.resume:
+                checkpoint.clear()
+        dev_perceptron = None
+        if args.dev_data:
+            print('extract dev features')
+            dev_data = load_data(args.dev_data, True, args.binary)
+            dev_perceptron = Perceptron(dev_data, train_features, workers, labeler, index, prune=min_count is not None)
+        train_w = train_perceptron.train(N, scheduler, checkpoint, dev_perceptron, model['w'] if args.update else None)
         print('learning ended: ', time.time() - start)
         # train evaluation
         start = time.time()
         print('train evaluation')
         train_accuracy = evaluate(train_data, train_w, train_perceptron)
         print('train accuracy: ', train_accuracy)
+        if labeled:
+            print('train labeled accuracy: ', train_perceptron.labeled_accuracy(train_w))
         print('evaluation ended: ', time.time() - start)
         # save train weights
-        pickle.dump(train_w, open('cache/' + features_type + '_N' + str(N) + '.pickle', 'wb'))
+        if stable:
+            model = {'features': train_features, 'index': index, 'labeler': labeler, 'w': train_w}
+            pickle.dump(model, open(args.update or 'cache/' + model_name + '_N' + str(N) + '.pickle', 'wb'))
+        else:
+            pickle.dump(train_w, open('cache/' + model_name + '_N' + str(N) + '.pickle', 'wb'))
+
+    if args.export:  # inference runs on the compact model directly
+        model = compact(train_features, train_w, labeler, index, int(args.bits) if args.bits else None)
+        pickle.dump(model, open(args.export, 'wb'))
+        train_w, index, labeler = model['w'], model['index'], model['labeler']
+        print('exported', len(train_w), train_w.dtype, 'weights')
 
     # init test
     start = time.time()
     print('extract test features')
-    test_data = Data('test.labeled', is_labeled=True)
-    test_perceptron = Perceptron(test_data, train_features)
+    test_data = load_data('test.labeled', True, args.binary)
+    test_perceptron = Perceptron(test_data, train_features, workers, labeler, index, unique=True,
+                                 prune=min_count is not None)
     print('extract ended', time.time() - start)
 
     start = time.time()
     print('test evaluation')
-    test_accuracy = evaluate(test_data, train_w, test_perceptron)
+    cache = None
+    if args.cache:
+        cache = ParseCache(model_identity(train_w, train_features, labeler), file_name=args.cache)
+    test_accuracy = evaluate(test_data, train_w, test_perceptron, cache)
     print('test accuracy: ', test_accuracy)
+    if labeled:
+        print('test labeled accuracy: ', test_perceptron.labeled_accuracy(train_w, cache))
+    if cache is not None:
+        print(cache.report())
+        cache.save()
     print('evaluation ended: ', time.time() - start)
@@ -0,0 +1,133 @@
+# !/usr/bin/env python
+from data import *
+from perceptron import *
+from feature_store import *
+from features import *
+import pickle
+
+
+def load_model(file_name, train_data):
+    """
+    load a model saved by main.py as a (features, w, labeler, index) tuple, see Parser.load
+    stable and exported models carry their features, plain weights files rebuild them from the training data
+    """
+    with open(file_name, 'rb') as fh:
+        model = pickle.load(fh)
+    if isinstance(model, dict) and model.get('transition'):
+        raise ValueError('%s is a transition model, it has no arc scores to decode' % file_name)
+    if isinstance(model, dict):
+        return model['features'], model['w'], model['labeler'], model['index']
+    features_class = BasicFeatures if 'basic' in file_name else ComplexFeatures
+    features = features_class(train_data.vocab_list, train_data.pos_list, train_data.word_pos_pairs)
+    labeler = None
+    if 'labeled' in file_name:
+        labeler = Labeler(train_data.relation_list, window_list(features))
+    return features, model, labeler, None
+
+
+class MultiModel:
+    """several models decoded over one shared features extraction"""
+
+    def __init__(self, features, models):
+        """
+        :param features: features object holding the union of all models templates
+        :param models: list of (features, w), (features, w, labeler) or (features, w, labeler, index) tuples,
+                       every model templates must be a prefix of 'features' templates,
+                       a model with a FeatureIndex (stable or exported) is scored through it
+        """
+        self._features = features
+        self._window_list = window_list(features)
+        self._models = []
+        for model in models:
+            model_features, w = model[:2]
+            labeler = model[2] if len(model) > 2 else None
+            index = model[3] if len(model) > 3 else None
+            model_window_list = window_list(model_features)
+            if self._window_list[:len(model_window_list)] != model_window_list:
+                raise ValueError('model templates are not a prefix of the shared templates')
+            layout = index if index is not None else DenseLayout(model_window_list)
+            self._models.append((len(model_window_list), layout, w, labeler))
+
+    def predict_sentence(self, shifts, sentence_len):
+        """decode all models on one sentence, return list of (parents, relations) pairs, relations may be None"""
+        preds = []
+        for templates_num, layout, w, labeler in self._models:
+            # an index keys the shared templates past the model ones as relation features
+            parents, relation_ids = labeled_decode(w, shifts[:, :templates_num], layout, sentence_len, labeler)
+            preds.append((parents, labeler.relations(relation_ids) if labeler is not None else None))
+        return preds
+
+    def predict(self, data):
+        """extract features once and decode all models, return a predictions list per model"""
+        store = FeatureStore(data.sentences, self._features)
+        pred_lists = [[] for _ in self._models]
+        for idx, sentence in enumerate(data.sentences):
+            for pred_list, (parents, _) in zip(pred_lists, self.predict_sentence(store[idx], sentence.sentence_len)):
+                pred_list.append(parents)
+        return pred_lists
+
+    def write(self, in_file_name, out_file_names):
+        """parse an unlabeled file, write every model predictions to its own output file in one pass"""
+        out_fhs = [open(out_file_name, 'w') for out_file_name in out_file_names]
+        with open(in_file_name, 'r') as fh:
+            for sentence_txt in fh.read().split('\n\n'):
+                if sentence_txt == '':  # avoid last empty sentence
+                    continue
+                sentence = sentence_preprocess(sentence_txt, is_labeled=False)
+                preds = self.predict_sentence(sentence_shifts(sentence, self._features), sentence.sentence_len)
+                for out_fh, (parents, relations) in zip(out_fhs, preds):
+                    for word_num, line in enumerate(sentence_txt.split('\n'), 1):
+                        args = line.split()
+                        args[6] = str(parents[word_num])
+                        if relations is not None:
+                            args[7] = relations[word_num]
+                        out_fh.write('\t'.join(args) + '\r\n')
+                    out_fh.write('\r\n')
+        for out_fh in out_fhs:
+            out_fh.close()
+
+
+if __name__ == '__main__':
+    from features import *
+
+    class ToyData:
+        sentences = [Sentence(['ofir', 'roy', 'tomer'], ['S', 'T', 'S']), Sentence(['nadav', 'roy'], ['T', 'T'])]
+        sentences_num = 2
+
+    vocab_list = ['ofir', 'tomer', 'nadav', 'roy']
+    pos_list = ['S', 'T']
+    word_pos_pairs = [('ofir', 'S'), ('tomer', 'S'), ('nadav', 'T'), ('roy', 'T')]
+    basic = BasicFeatures(vocab_list, pos_list, word_pos_pairs)
+    complex = ComplexFeatures(vocab_list, pos_list, word_pos_pairs)
+    basic_w = np.random.RandomState(0).randint(-5, 5, basic.features_len())
+    complex_w = np.random.RandomState(1).randint(-5, 5, complex.features_len())
+
+    # validate fused predictions against separate perceptrons
+    models = MultiModel(complex, [(basic, basic_w), (complex, complex_w)])
+    basic_pred, complex_pred = models.predict(ToyData)
+    for features, w, pred_list in [(basic, basic_w, basic_pred), (complex, complex_w, complex_pred)]:
+        perceptron = Perceptron(ToyData, features)
+        for idx, sentence in enumerate(ToyData.sentences):
+            assert pred_list[idx] == perceptron.sentence_inference(w, sentence.sentence_len, perceptron._store[idx])
+
+    # validate an indexed basic model (relation features keyed past its templates) in the complex store
+    index = FeatureIndex()
+    labeler = Labeler(['NMOD', 'P'], window_list(basic), index=index)
+    for sentence in ToyData.sentences:
+        shifts = sentence_shifts(sentence, basic)
+        index.add(shifts)
+        labeler.index_features(shifts, sentence.sentence_len)
+    indexed_w = np.random.RandomState(2).randint(-5, 5, index.size())
+    indexed_pred, = MultiModel(complex, [(basic, indexed_w, labeler, index)]).predict(ToyData)
+    for idx, sentence in enumerate(ToyData.sentences):
+        assert indexed_pred[idx] == labeled_decode(indexed_w, sentence_shifts(sentence, basic), index,
+                                                   sentence.sentence_len, labeler)[0]
+
+    # validate templates prefix check
+    try:
+        MultiModel(basic, [(complex, complex_w)])
+        assert False
+    except ValueError:
+        pass
+
+    print('PASSED!')
@@ -0,0 +1,141 @@
+# !/usr/bin/env python
+from collections import OrderedDict
+import hashlib
+import os
+import pickle
+import numpy as np
+
+
+def model_identity(w, features, labeler=None):
+    """return digest identifying a model - its weights, features type and templates, and relations"""
+    digest = hashlib.sha1(np.ascontiguousarray(w).tobytes())
+    digest.update(type(features).__name__.encode())
+    digest.update(repr(features.features_len()).encode())
+    if labeler is not None:
+        digest.update(repr(labeler.relation_list).encode())
+    return digest.hexdigest()
+
+
+class ParseCache:
+    """
+    LRU cache of parse results of repeated sentences
+    a sentence is keyed by a hash of its (word, pos) sequence and the model identity
+    """
+
+    def __init__(self, model_id, max_size=100000, file_name=None):
+        """
+        :param model_id: model identity, see model_identity
+        :param max_size: max number of cached parses, least recently used parses are evicted
+        :param file_name: optional file to persist the cache across runs, loaded if it holds the same model
+        """
+        self._model_id = model_id
+        self._max_size = max_size
+        self._file_name = file_name
+        self._parses = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        if file_name is not None and os.path.exists(file_name):
+            with open(file_name, 'rb') as fh:
+                state = pickle.load(fh)
+            if state['model_id'] == model_id:
+                self._parses = state['parses']
+                self._evict()
+
+    def __len__(self):
+        """return number of cached parses"""
+        return len(self._parses)
+
+    def key(self, sentence):
+        """return cache key of a sentence"""
+        digest = hashlib.blake2b(self._model_id.encode(), digest_size=16)
+        for idx in range(1, sentence.sentence_len):
+            word, pos = sentence(idx)
+            digest.update(word.encode() + b'\x00' + pos.encode() + b'\x01')
+        return digest.digest()
+
+    def get(self, sentence):
+        """return the cached parse of a sentence, None on a miss"""
+        key = self.key(sentence)
+        if key not in self._parses:
+            self.misses += 1
+            return None
+        self.hits += 1
+        self._parses.move_to_end(key)
+        return self._parses[key]
+
+    def put(self, sentence, parse):
+        """cache the parse of a sentence"""
+        key = self.key(sentence)
+        self._parses[key] = parse
+        self._parses.move_to_end(key)
+        self._evict()
+
+    def lookup(self, sentence, decode):
+        """return the cached parse of a sentence, decode() and cache it on a miss"""
+        parse = self.get(sentence)
+        if parse is None:
+            parse = decode()
+            self.put(sentence, parse)
+        return parse
+
+    def _evict(self):
+        """drop least recently used parses over the size budget"""
+        while len(self._parses) > self._max_size:
+            self._parses.popitem(last=False)
+
+    def save(self):
+        """persist the cache, never leave a half written file behind"""
+        tmp_file_name = self._file_name + '.tmp'
+        with open(tmp_file_name, 'wb') as fh:
+            pickle.dump({'model_id': self._model_id, 'parses': self._parses}, fh, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp_file_name, self._file_name)
+
+    def report(self):
+        """return cache statistics string"""
+        total = self.hits + self.misses
+        return 'cache hits: %d / %d, misses: %d, size: %d' % (self.hits, total, self.misses, len(self._parses))
+
+
+if __name__ == '__main__':
+    from sentence import *
+    import tempfile
+
+    first = Sentence(['ofir', 'roy'], ['S', 'T'])
+    second = Sentence(['ofir', 'roy'], ['S', 'S'])
+    third = Sentence(['tomer'], ['S'])
+
+    # validate keys
+    cache = ParseCache('model', max_size=2)
+    assert cache.key(first) == cache.key(Sentence(['ofir', 'roy'], ['S', 'T']))
+    assert cache.key(first) != cache.key(second)
+    assert cache.key(first) != ParseCache('other').key(first)
+
+    # validate hits, misses and lru eviction
+    assert cache.get(first) is None
+    cache.put(first, {1: 0, 2: 1})
+    cache.put(second, {1: 2, 2: 0})
+    assert cache.get(first) == {1: 0, 2: 1}
+    cache.put(third, {1: 0})
+    assert cache.get(second) is None and cache.get(first) is not None and len(cache) == 2
+    assert cache.lookup(third, lambda: None) == {1: 0}
+    assert (cache.hits, cache.misses) == (3, 2)
+
+    # validate persistence, a different model doesn't reuse the parses
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        file_name = os.path.join(tmp_dir, 'parses.pickle')
+        cache = ParseCache('model', file_name=file_name)
+        cache.put(first, {1: 0, 2: 1})
+        cache.save()
+        assert ParseCache('model', file_name=file_name).get(first) == {1: 0, 2: 1}
+        assert len(ParseCache('other', file_name=file_name)) == 0
+        assert len(ParseCache('model', max_size=0, file_name=file_name)) == 0
+
+    # validate model identity
+    class ToyFeatures:
+        def features_len(self):
+            return 3
+
+    assert model_identity(np.zeros(3), ToyFeatures()) == model_identity(np.zeros(3), ToyFeatures())
+    assert model_identity(np.zeros(3), ToyFeatures()) != model_identity(np.ones(3), ToyFeatures())
+
+    print('PASSED!')
@@ -1,7 +1,11 @@
 # !/usr/bin/env python
 from chu_liu import *
+from scheduler import *
+from feature_store import *
+from labeler import *
+from pruned_store import *
 import numpy as np
-from random import shuffle
+from random import shuffle, getstate, setstate
 
 
 def tree_2_parent(tree):
@@ -12,104 +16,330 @@ def tree_2_parent(tree):
     return p_dict
 
 
+_full_graphs = dict()
+
+
+def full_graph(node_num):
+    """return (cached) full graph over node_num nodes, root has no incoming edges"""
+    if node_num not in _full_graphs:
+        g = dict()
+        g[0] = [m for m in range(1, node_num)]
+        for h in range(1, node_num):
+            g[h] = [m for m in range(1, node_num) if m != h]
+        _full_graphs[node_num] = g
+    return _full_graphs[node_num]
+
+
+def mst_decode(scores):
+    """decode arc scores matrix into the maximum spanning tree, return parents dictionary"""
+    rows = scores.tolist()
+    graph = Digraph(full_graph(len(rows)), lambda h, m: rows[h][m])
+    return tree_2_parent(graph.mst().successors)
+
+
+def joint_decode(scores, best_relations=None):
+    """
+    decode arc scores matrix, every arc is scored with its best relation before the MST decoding
+    :param best_relations: optional best relation scores and best relation indices matrices
+    :return: parents dictionary, relation index dictionary (None without relations)
+    """
+    if best_relations is None:
+        return mst_decode(scores), None
+    best_scores, best_relations = best_relations
+    parents = mst_decode(scores + best_scores)
+    return parents, {m: int(best_relations[h, m]) for m, h in parents.items()}
+
+
+def labeled_decode(w, shifts, layout, sentence_len, labeler=None):
+    """
+    joint arc-relation decoding
+    :param layout: arc weights layout (DenseLayout or FeatureIndex)
+    :return: parents dictionary, relation index dictionary (None without labeler)
+    """
+    scores = scores_matrix(w, shifts, layout, sentence_len)
+    if labeler is None:
+        return joint_decode(scores)
+    return joint_decode(scores, labeler.best_relations(w, shifts, sentence_len))
+
+
 class Perceptron:
     """perceptron class"""
 
-    def __init__(self, data, features):
-        """init perceptron, extract all features"""
+    def __init__(self, data, features, workers=1, labeler=None, index=None, grow_index=False, min_count=None,
+                 unique=False, prune=False):
+        """
+        init perceptron, extract all features over 'workers' processes
+        :param labeler: optional Labeler for labeled parsing
+        :param index: optional FeatureIndex - stable weight ids instead of the dense templates layout
+        :param grow_index: add all features of data to the index (training data)
+        :param min_count: grow the index only with features of gold arcs seen at least min_count times,
+                          int or per template list
+        :param unique: extract repeated sentences once (evaluation data), see FeatureStore
+        :param prune: keep only the indexed features of every arc (thresholded index) if that takes less memory
+                      than the shifts, see PrunedStore
+        """
         self._data = data
         self._features = features
-        self._f_dict_list = self.extract_features()
+        self._workers = workers
+        self._labeler = labeler
+        self._index = index
+        self._unique = unique
+        self._store = self.extract_features()
         self._window_list = self.window_list()
-        self._full_graphs = dict()
-        for sentence in self._data.sentences:
-            if sentence.sentence_len not in self._full_graphs:
-                self._full_graphs[sentence.sentence_len] = self.full_graph(sentence.sentence_len)
+        self._layout = index if index is not None else DenseLayout(self._window_list)
+        if grow_index:
+            self.index_features(min_count=min_count)
+        if prune:
+            if index is None:
+                raise ValueError('pruning drops unindexed features, it needs a FeatureIndex')
+            pruned = PrunedStore(self._store, index, labeler)
+            if pruned.nbytes() < self._store.shifts.nbytes:
+                self._store = pruned
 
     def window_list(self):
         """save window list"""
-        win_list = []
-        for _, window in self._features(0, 1, self._data.sentences[0]):
-            win_list.append(window)
-        return win_list
-
-    def features_dict(self, sentence):
-        """generate features dictionary per sentence"""
-        f_dict = dict()
-        for h in range(sentence.sentence_len):
-            for m in range(1, sentence.sentence_len):
-                if h != m:
-                    f_dict[(h, m)] = [shift for shift, _ in self._features(h, m, sentence)]
-        return f_dict
+        return self._store.window_list
 
     def extract_features(self):
         """extract features for all sentences"""
-        f_dict_list = []
-        for sentence in self._data.sentences:
-            f_dict_list.append(self.features_dict(sentence))
-        return f_dict_list
+        return FeatureStore(self._data.sentences, self._features, self._workers, self._unique)
 
-    def sentence_inference(self, w, sentence_len, f_dict):
-        """inference on a given sentence"""
+    def index_features(self, chunk_len=100, min_count=None):
+        """add the features of all arcs to the index, 'chunk_len' sentences at a time"""
+        if min_count is not None:
+            return self.index_gold_features(min_count)
+        for start in range(0, len(self._store), chunk_len):
+            end = min(start + chunk_len, len(self._store))
+            self._index.add(self._store.shifts[self._store.arc_offsets[start]:self._store.arc_offsets[end]])
+        if self._labeler is not None:
+            for idx in range(len(self._store)):
+                self._labeler.index_features(self._store[idx], int(self._store.sentence_lens[idx]))
+
+    def index_gold_features(self, min_count):
+        """add the features of gold arcs seen at least min_count times to the index"""
+        gold_shifts, label_shifts = [], []
+        for idx, sentence in enumerate(self._data.sentences):
+            sentence_len, shifts = int(self._store.sentence_lens[idx]), self._store[idx]
+            rows = arc_rows(sentence_len)
+            gold_rows = [rows[h, m] for m, h in sentence.dependency_tree().items()]
+            gold_shifts.append(shifts[gold_rows])
+            if self._labeler is not None:
+                label_shifts.append(self._labeler.label_shifts(shifts, sentence_len)[gold_rows])
+        self._index.add(np.concatenate(gold_shifts), min_count=min_count)
+        if self._labeler is not None:
+            self._labeler.index_gold_features(np.concatenate(label_shifts), min_count)
 
-        def get_score(h, m):
-            pos = 0
-            score = 0
-            for shift, window in zip(f_dict.get((h, m), -1), self._window_list):
-                if shift != -1:
-                    score += w[pos + shift]
-                pos += window
-            return score
+    def weights_len(self):
+        """return weights vector length, arc weights followed by relation weights"""
+        if self._index is not None:
+            return self._index.size()
+        if self._labeler is None:
+            return self._features.features_len()
+        return self._features.features_len() + self._labeler.weights_len()
+
+    def sentence_inference(self, w, sentence_len, shifts):
+        """inference on a given sentence"""
+        return self.labeled_inference(w, sentence_len, shifts)[0]
 
-        graph = Digraph(self._full_graphs[sentence_len], get_score)
+    def labeled_inference(self, w, sentence_len, shifts):
+        """labeled inference on a sentence (shifts or PrunedArcs), return parents and relation index dictionaries"""
+        if not isinstance(shifts, PrunedArcs):
+            return labeled_decode(w, shifts, self._layout, sentence_len, self._labeler)
+        if self._labeler is None:
+            return joint_decode(shifts.scores_matrix(w, sentence_len))
+        return joint_decode(shifts.scores_matrix(w, sentence_len),
+                            shifts.best_relations(w, sentence_len, len(self._labeler.relation_list)))
 
-        mst = graph.mst()
-        return tree_2_parent(mst.successors)
+    def cached_inference(self, w, idx, cache=None):
+        """labeled inference on sentence 'idx', looked up in the optional ParseCache first"""
+        sentence_len = int(self._store.sentence_lens[idx])
+        if cache is None:
+            return self.labeled_inference(w, sentence_len, self._store[idx])
+        return cache.lookup(self._data.sentences[idx],
+                            lambda: self.labeled_inference(w, sentence_len, self._store[idx]))
 
     def full_graph(self, node_num):
         """generate full graph"""
-        g = dict()
-        g[0] = [m for m in range(1, node_num)]
-        for h in range(1, node_num):
-            g[h] = [m for m in range(1, node_num) if m != h]
-        return g
-
-    def update_weights(self, w, exact_d_tree, infer_d_tree, f_dict):
-        """update weights"""
-        for m, h in exact_d_tree.items():
-            if infer_d_tree[m] != h:
-                pos = 0
-                for shift, window in zip(f_dict.get((h, m), -1), self._window_list):
-                    if shift != -1:
-                        w[pos + shift] += 1
-                    pos += window
-
-        for m, h in infer_d_tree.items():
-            if exact_d_tree[m] != h:
-                pos = 0
-                for shift, window in zip(f_dict.get((h, m), -1), self._window_list):
-                    if shift != -1:
-                        w[pos + shift] += -1
-                    pos += window
-
-    def train(self, N):
+        return full_graph(node_num)
+
+    def update_weights(self, w, exact_d_tree, infer_d_tree, shifts, exact_relations=None, infer_relations=None):
+        """update weights, return the array of weight indices whose value changed"""
+        sentence_len = len(exact_d_tree) + 1
+        rows = arc_rows(sentence_len)
+        gold_rows = np.array([rows[h, m] for m, h in exact_d_tree.items() if infer_d_tree[m] != h], dtype=np.int64)
+        infer_rows = np.array([rows[h, m] for m, h in infer_d_tree.items() if exact_d_tree[m] != h], dtype=np.int64)
+        if isinstance(shifts, PrunedArcs):
+            gold_ids, infer_ids = shifts.arc_ids(gold_rows), shifts.arc_ids(infer_rows)
+        else:
+            gold_ids, gold_found = self._layout.ids(shifts[gold_rows])
+            infer_ids, infer_found = self._layout.ids(shifts[infer_rows])
+            gold_ids, infer_ids = gold_ids[gold_found], infer_ids[infer_found]
+
+        if self._labeler is not None:
+            # relation features of every modifier whose (head, relation) is wrong,
+            # relations unknown to the model (-1, new in updated data) have no weights and aren't learnt
+            wrong = [m for m in exact_d_tree if exact_relations[m] != -1 and
+                     (exact_d_tree[m], exact_relations[m]) != (infer_d_tree[m], infer_relations[m])]
+            gold = [rows[exact_d_tree[m], m] for m in wrong], [exact_relations[m] for m in wrong]
+            infer = [rows[infer_d_tree[m], m] for m in wrong], [infer_relations[m] for m in wrong]
+            if isinstance(shifts, PrunedArcs):
+                gold_ids = np.concatenate([gold_ids, shifts.relation_ids(*gold)])
+                infer_ids = np.concatenate([infer_ids, shifts.relation_ids(*infer)])
+            else:
+                gold_ids = np.concatenate([gold_ids, self._labeler.weight_ids(shifts, sentence_len, *gold)])
+                infer_ids = np.concatenate([infer_ids, self._labeler.weight_ids(shifts, sentence_len, *infer)])
+
+        # features of both trees cancel out, only the net changed weights are touched
+        ids, inverse = np.unique(np.concatenate([gold_ids, infer_ids]), return_inverse=True)
+        delta = np.bincount(inverse, weights=np.repeat([1, -1], [len(gold_ids), len(infer_ids)]),
+                            minlength=len(ids)).astype(np.int64)
+        changed = delta != 0
+        w[ids[changed]] += delta[changed]
+        return ids[changed]
+
+    def feature_ids(self, idx):
+        """return all weight indices the arcs of sentence 'idx' may use"""
+        if isinstance(self._store, PrunedStore):
+            return self._store[idx].feature_ids(len(self._labeler.relation_list) if self._labeler is not None else 0)
+        ids, found = self._layout.ids(self._store[idx])
+        ids = np.unique(ids[found])
+        if self._labeler is None:
+            return ids
+        sentence_len = int(self._store.sentence_lens[idx])
+        return np.concatenate([ids, self._labeler.feature_ids(self._store[idx], sentence_len)])
+
+    def scheduler(self, max_skip=4):
+        """return active sentence scheduler over the training sentences"""
+        return ActiveScheduler(self.weights_len(), self.feature_ids, max_skip)
+
+    def accuracy(self, w, cache=None):
+        """evaluate model accuracy per word, data must be labeled, repeated sentences may be decoded once by cache"""
+        total = 0
+        correct = 0
+        for idx, sentence in enumerate(self._data.sentences):
+            ground_truth = sentence.dependency_tree()
+            predicted = self.cached_inference(w, idx, cache)[0]
+            for x in range(1, sentence.sentence_len):
+                total += 1
+                if predicted[x] == ground_truth[x]:
+                    correct += 1
+        return correct / total
+
+    def labeled_accuracy(self, w, cache=None):
+        """evaluate model labeled accuracy per word (head and relation), data must be labeled"""
+        total = 0
+        correct = 0
+        for idx, sentence in enumerate(self._data.sentences):
+            ground_truth = sentence.dependency_tree()
+            relations = self._labeler.relation_ids(sentence.relations())
+            predicted, predicted_relations = self.cached_inference(w, idx, cache)
+            for x in range(1, sentence.sentence_len):
+                total += 1
+                if predicted[x] == ground_truth[x] and predicted_relations[x] == relations[x]:
+                    correct += 1
+        return correct / total
+
+    def train(self, N, scheduler=None, checkpoint=None, dev=None, w=None):
         """
         train the model
         :param N: number of iterations
-        :return w: learnt weights
+        :param scheduler: optional ActiveScheduler, skips sentences parsed correctly
+        :param checkpoint: optional Checkpoint, saved after every epoch and resumed from if it exists
+        :param dev: optional Perceptron over labeled dev data (same features), evaluated after every epoch
+        :param w: optional weights to continue training from (indexed models grow them to the index size),
+                  narrow (exported) weights are widened to int first
+        :return w: learnt weights, the best epoch weights on dev if dev is given
         """
-        w = np.zeros(self._features.features_len(), dtype=int)
-        indices = [i for i in range(self._data.sentences_num)]
-        for n in range(N):
+        if w is None:
+            w = np.zeros(self.weights_len(), dtype=int)
+        elif self._index is not None:
+            w = self._index.grow(w.astype(int))
+        else:
+            w = w.astype(int)
+        state = checkpoint.load() if checkpoint is not None else None
+        if state is None:
+            state = {'epoch': 0, 'w': w,
+                     'indices': [i for i in range(self._data.sentences_num)], 'random_state': getstate(),
+                     'scheduler': None, 'history': [], 'best_epoch': 0, 'best_accuracy': -1, 'best_w': None}
+        else:
+            print('resume from epoch', state['epoch'])
+            if scheduler is not None and state['scheduler'] is not None:
+                scheduler.load_state(state['scheduler'])
+        setstate(state['random_state'])
+        w = state['w']
+        indices = state['indices']
+
+        for n in range(state['epoch'], N):
             print('iteration', n + 1, '/', N)
             for idx in indices:
+                if scheduler is not None and not scheduler.need_decode(idx, n):
+                    continue
                 sentence = self._data.sentences[idx]
-                inference_d_tree = self.sentence_inference(w, sentence.sentence_len, self._f_dict_list[idx])
-                if sentence.dependency_tree() != inference_d_tree:
-                    self.update_weights(w, sentence.dependency_tree(), inference_d_tree, self._f_dict_list[idx])
+                inference_d_tree, inference_relations = self.labeled_inference(w, sentence.sentence_len,
+                                                                               self._store[idx])
+                relations = None
+                if self._labeler is not None:
+                    relations = self._labeler.relation_ids(sentence.relations())
+                correct = sentence.dependency_tree() == inference_d_tree and relations == inference_relations
+                touched = []
+                if not correct:
+                    touched = self.update_weights(w, sentence.dependency_tree(), inference_d_tree, self._store[idx],
+                                                  relations, inference_relations)
+                if scheduler is not None:
+                    scheduler.record(idx, n, correct, touched)
             shuffle(indices)
-        return w
+            if scheduler is not None:
+                print(scheduler.report())
+
+            state['epoch'] = n + 1
+            if dev is not None:
+                dev_accuracy = dev.labeled_accuracy(w) if dev._labeler is not None else dev.accuracy(w)
+                state['history'].append((n + 1, dev_accuracy))
+                print('dev accuracy: ', dev_accuracy)
+                if dev_accuracy > state['best_accuracy']:
+                    state['best_epoch'], state['best_accuracy'], state['best_w'] = n + 1, dev_accuracy, w.copy()
+            if checkpoint is not None:
+                state['random_state'] = getstate()
+                state['scheduler'] = scheduler.state() if scheduler is not None else None
+                checkpoint.save(state)
 
+        self.history = state['history']
+        if dev is not None and state['best_w'] is not None:
+            print('best epoch', state['best_epoch'], 'dev accuracy: ', state['best_accuracy'])
+            return state['best_w']
+        return w
 
 if __name__ == '__main__':
+    from features import *
+    from random import seed
+
+    vocab_list = ['ofir', 'tomer', 'nadav', 'roy']
+    pos_list = ['S', 'T']
+    word_pos_pairs = [('ofir', 'S'), ('tomer', 'S'), ('nadav', 'T'), ('roy', 'T')]
+    complex = ComplexFeatures(vocab_list, pos_list, word_pos_pairs)
+
+    class ToyData:
+        sentences = [LabeledSentence(['ofir', 'roy', 'tomer'], ['S', 'T', 'S'], [2, 0, 2], ['NMOD', 'ROOT', 'P']),
+                     LabeledSentence(['tomer', 'nadav', 'roy'], ['S', 'T', 'T'], [2, 0, 2], ['NMOD', 'ROOT', 'P']),
+                     LabeledSentence(['nadav', 'roy'], ['T', 'T'], [0, 1], ['ROOT', 'NMOD'])]
+        sentences_num = len(sentences)
+
+    # a pruned store drops the features below min_count and learns the same weights as the masked shifts
+    weights = []
+    for prune in [False, True]:
+        index = FeatureIndex()
+        labeler = Labeler(['NMOD', 'P', 'ROOT'], window_list(complex), index=index)
+        perceptron = Perceptron(ToyData, complex, labeler=labeler, index=index, grow_index=True, min_count=2,
+                                prune=prune)
+        seed(0)
+        weights.append(perceptron.train(3, perceptron.scheduler()))
+        assert perceptron.labeled_accuracy(weights[-1]) > 0
+    assert weights[0].any() and (weights[0] == weights[1]).all()
+    assert len(perceptron._store.ids) < (FeatureStore(ToyData.sentences, complex).shifts != -1).sum()
+    try:
+        Perceptron(ToyData, complex, prune=True)
+        assert False
+    except ValueError:
+        pass
+
     print('PASSED!')
@@ -0,0 +1,183 @@
+# !/usr/bin/env python
+from labeler import *
+import numpy as np
+
+
+def segment_sums(values, offsets):
+    """return the sums of the segments values[offsets[i]:offsets[i + 1]] along the first axis, 0 for an empty one"""
+    values = np.concatenate([values, np.zeros((1,) + values.shape[1:], dtype=values.dtype)])
+    sums = np.add.reduceat(values, offsets[:-1], axis=0)
+    sums[offsets[:-1] == offsets[1:]] = 0
+    return sums
+
+
+def segments(values, offsets, rows):
+    """return the concatenated segments 'rows' of values and the length of every segment"""
+    rows = np.asarray(rows, dtype=np.int64)
+    lens = offsets[rows + 1] - offsets[rows]
+    starts = np.repeat(offsets[rows] - np.cumsum(lens) + lens, lens)
+    return values[starts + np.arange(lens.sum())], lens
+
+
+class PrunedArcs:
+    """weight indices of the indexed features of the arcs of one sentence, in arcs order"""
+
+    def __init__(self, ids, offsets, label_ids=None, label_offsets=None):
+        """
+        :param ids: arc weight indices of all arcs, arc i holds ids[offsets[i]:offsets[i + 1]]
+        :param label_ids: relation features base indices of all arcs (labeled models), the same way
+        """
+        self.ids = ids
+        self.offsets = offsets
+        self.label_ids = label_ids
+        self.label_offsets = label_offsets
+
+    def scores_matrix(self, w, sentence_len):
+        """return (sentence_len, sentence_len) arc scores matrix"""
+        heads, mods = arcs(sentence_len)
+        arc_scores_array = segment_sums(w[self.ids], self.offsets)
+        scores = np.zeros((sentence_len, sentence_len), dtype=arc_scores_array.dtype)
+        scores[heads, mods] = arc_scores_array
+        return scores
+
+    def best_relations(self, w, sentence_len, relations_num):
+        """return best relation score and best relation index of every arc, as (sentence_len, sentence_len) matrices"""
+        relation_scores = segment_sums(w[self.label_ids[:, None] + np.arange(relations_num)], self.label_offsets)
+        heads, mods = arcs(sentence_len)
+        best_scores = np.zeros((sentence_len, sentence_len), dtype=relation_scores.dtype)
+        best_relations = np.zeros((sentence_len, sentence_len), dtype=np.int64)
+        best_scores[heads, mods] = relation_scores.max(axis=1)
+        best_relations[heads, mods] = relation_scores.argmax(axis=1)
+        return best_scores, best_relations
+
+    def arc_ids(self, rows):
+        """return arc weight indices of the arcs 'rows'"""
+        return segments(self.ids, self.offsets, rows)[0]
+
+    def relation_ids(self, rows, relation_ids):
+        """return weights vector indices of the relation features of arcs 'rows' labeled 'relation_ids'"""
+        ids, lens = segments(self.label_ids, self.label_offsets, rows)
+        return ids + np.repeat(np.asarray(relation_ids, dtype=np.int64), lens)
+
+    def feature_ids(self, relations_num=0):
+        """return all weight indices the arcs may use"""
+        ids = np.unique(self.ids)
+        if self.label_ids is None:
+            return ids
+        return np.concatenate([ids, (np.unique(self.label_ids)[:, None] + np.arange(relations_num)).ravel()])
+
+
+class PrunedStore:
+    """
+    weight indices of the indexed features of every arc of every sentence, stored in one array
+    unindexed features (below a FeatureIndex min_count) are dropped, every arc keeps only the ids its score sums
+    """
+
+    def __init__(self, store, layout, labeler=None):
+        """
+        resolve the shifts of a FeatureStore once, the store may be dropped afterwards
+        :param layout: arc weights layout (a thresholded FeatureIndex)
+        :param labeler: optional Labeler, its relation features are kept as well
+        """
+        self.window_list = store.window_list
+        self.sentence_lens = store.sentence_lens
+        self._rows = store._rows
+        self.arc_offsets = store.arc_offsets
+        ids, lens, label_ids, label_lens = [], [], [], []
+        for row, sentence_len in enumerate(store.extracted_lens.tolist()):
+            shifts = store.shifts[store.arc_offsets[row]:store.arc_offsets[row + 1]]
+            sentence_ids, found = layout.ids(shifts)
+            ids.append(sentence_ids[found])
+            lens.append(found.sum(axis=1))
+            if labeler is not None:
+                sentence_ids, found = labeler.label_ids(shifts, sentence_len)
+                label_ids.append(sentence_ids[found])
+                label_lens.append(found.sum(axis=1))
+        self.ids, self.lens, self.starts = self._concatenate(ids, lens)
+        self.label_ids, self.label_lens, self.label_starts = None, None, None
+        if labeler is not None:
+            self.label_ids, self.label_lens, self.label_starts = self._concatenate(label_ids, label_lens)
+
+    @staticmethod
+    def _concatenate(ids, lens):
+        """return all ids in one array, the number of ids of every arc and the first id of every sentence"""
+        starts = np.concatenate([[0], np.cumsum([len(sentence_ids) for sentence_ids in ids])]).astype(np.int64)
+        ids = np.concatenate(ids).astype(np.int32) if ids else np.zeros(0, dtype=np.int32)
+        lens = np.concatenate(lens).astype(np.uint16) if lens else np.zeros(0, dtype=np.uint16)
+        return ids, lens, starts
+
+    def __len__(self):
+        """return number of sentences"""
+        return len(self.sentence_lens)
+
+    def __getitem__(self, idx):
+        """return PrunedArcs of sentence 'idx'"""
+        row = self._rows[idx]
+        start, end = self.arc_offsets[row], self.arc_offsets[row + 1]
+        ids = self.ids[self.starts[row]:self.starts[row + 1]]
+        if self.label_ids is None:
+            return PrunedArcs(ids, self._offsets(self.lens[start:end]))
+        label_ids = self.label_ids[self.label_starts[row]:self.label_starts[row + 1]]
+        return PrunedArcs(ids, self._offsets(self.lens[start:end]), label_ids,
+                          self._offsets(self.label_lens[start:end]))
+
+    @staticmethod
+    def _offsets(lens):
+        """return ids offsets of arcs of 'lens' ids each"""
+        return np.concatenate([[0], np.cumsum(lens, dtype=np.int64)])
+
+    def nbytes(self):
+        """return bytes held by the ids and lengths arrays"""
+        arrays = [self.ids, self.lens, self.starts, self.label_ids, self.label_lens, self.label_starts]
+        return sum(array.nbytes for array in arrays if array is not None)
+
+
+if __name__ == '__main__':
+    from features import *
+
+    vocab_list = ['ofir', 'tomer', 'nadav', 'roy']
+    pos_list = ['S', 'T']
+    word_pos_pairs = [('ofir', 'S'), ('tomer', 'S'), ('nadav', 'T'), ('roy', 'T')]
+    complex = ComplexFeatures(vocab_list, pos_list, word_pos_pairs)
+    sentences = [Sentence(['ofir', 'roy'], ['S', 'T']), Sentence(['tomer', 'nadav', 'roy'], ['S', 'T', 'S']),
+                 Sentence(['ofir', 'roy'], ['S', 'T'])]
+
+    # validate segments
+    offsets = np.array([0, 2, 2, 5])
+    assert segment_sums(np.arange(5), offsets).tolist() == [1, 0, 9]
+    assert segment_sums(np.arange(10).reshape(5, 2), offsets).tolist() == [[2, 4], [0, 0], [18, 21]]
+    assert segments(np.arange(5), offsets, [2, 0])[0].tolist() == [2, 3, 4, 0, 1]
+
+    # thresholded index - only the features of the first sentence gold arcs
+    store = FeatureStore(sentences, complex, unique=True)
+    index = FeatureIndex()
+    index.add(store[0][[0]])
+    labeler = Labeler(['NMOD', 'P', 'ROOT'], window_list(complex), index=index)
+    labeler.index_gold_features(labeler.label_shifts(store[0], 3)[[0]])
+    pruned = PrunedStore(store, index, labeler)
+    assert len(pruned) == 3 and len(pruned.ids) < (store.shifts != -1).sum()
+
+    # pruned scores and ids equal the masked scores over the full shifts
+    w = np.random.RandomState(0).randint(-5, 5, index.size())
+    rows = [0, 3, 1]
+    for idx in range(3):
+        shifts, sentence_len = store[idx], int(store.sentence_lens[idx])
+        arcs_rows = [row for row in rows if row < len(shifts)]
+        assert (pruned[idx].scores_matrix(w, sentence_len) == scores_matrix(w, shifts, index, sentence_len)).all()
+        best_scores, best_relations = pruned[idx].best_relations(w, sentence_len, 3)
+        assert (best_scores == labeler.best_relations(w, shifts, sentence_len)[0]).all()
+        assert (best_relations == labeler.best_relations(w, shifts, sentence_len)[1]).all()
+        ids, found = index.ids(shifts[arcs_rows])
+        assert sorted(pruned[idx].arc_ids(arcs_rows)) == sorted(ids[found])
+        relation_ids = [2, 1, 0][:len(arcs_rows)]
+        assert sorted(pruned[idx].relation_ids(arcs_rows, relation_ids)) == \
+            sorted(labeler.weight_ids(shifts, sentence_len, arcs_rows, relation_ids))
+        assert set(pruned[idx].feature_ids(3)) == set(np.unique(index.ids(shifts)[0][index.ids(shifts)[1]])) | \
+            set(labeler.feature_ids(shifts, sentence_len))
+
+    # unlabeled store
+    pruned = PrunedStore(store, index)
+    assert pruned.label_ids is None and (pruned[2].ids == pruned[0].ids).all()
+    assert pruned.nbytes() < store.shifts.nbytes
+
+    print('PASSED!')
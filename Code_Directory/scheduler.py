@@ -0,0 +1,118 @@
+# !/usr/bin/env python
+import numpy as np
+
+
+class ActiveScheduler:
+    """
+    active sentence scheduler for perceptron training
+    a sentence parsed correctly is revisited at an exponentially lower rate, after 1, 2, 4.. epochs up to max_skip
+    (backoff), wrong parses are decoded every epoch, a correct sentence none of whose features changed since its
+    last decode is skipped as well (exact), but sentences share most features so this rarely holds
+    """
+
+    def __init__(self, features_len, feature_ids, max_skip=4):
+        """
+        :param features_len: number of weights
+        :param feature_ids: callable returning the weight indices used by sentence 'idx'
+        :param max_skip: max epochs between decodes of a correct sentence (1 -> exact skipping only)
+        """
+        if max_skip < 1:
+            raise ValueError('max_skip must be at least 1 epoch')
+        self._feature_ids = feature_ids
+        self._max_skip = max_skip
+        self._clock = 0
+        self._w_clock = np.zeros(features_len, dtype=np.int32)
+        self._ids = dict()
+        self._decoded_at = dict()
+        self._streak = dict()
+        self._due = dict()
+        self.decodes = 0
+        self.exact_skips = 0
+        self.backoff_skips = 0
+
+    def need_decode(self, idx, epoch):
+        """return True if sentence 'idx' has to be decoded in epoch 'epoch'"""
+        if self._streak.get(idx, 0) == 0:  # never decoded or wrong parse
+            return True
+        ids = self._ids.get(idx)
+        if ids is None:
+            ids = self._ids[idx] = self._feature_ids(idx)
+        if len(ids) == 0 or self._w_clock[ids].max() <= self._decoded_at[idx]:
+            self.exact_skips += 1
+            return False
+        if epoch < self._due[idx]:
+            self.backoff_skips += 1
+            return False
+        return True
+
+    def record(self, idx, epoch, correct, touched):
+        """record decode result of sentence 'idx' and the weight indices its update touched"""
+        self.decodes += 1
+        self._decoded_at[idx] = self._clock
+        if correct:
+            streak = self._streak.get(idx, 0) + 1
+            self._streak[idx] = streak
+            self._due[idx] = epoch + min(2 ** (streak - 1), self._max_skip)
+        else:
+            self._streak[idx] = 0
+        if len(touched):
+            self._clock += 1
+            self._w_clock[touched] = self._clock
+
+    def state(self):
+        """return scheduler state for checkpoints (cached feature ids are recomputed lazily)"""
+        return {key: value for key, value in self.__dict__.items() if key not in ('_feature_ids', '_ids')}
+
+    def load_state(self, state):
+        """restore scheduler state saved by state()"""
+        self.__dict__.update(state)
+
+    def report(self):
+        """return decode statistics string"""
+        skipped = self.exact_skips + self.backoff_skips
+        total = self.decodes + skipped
+        correct = sum(1 for streak in self._streak.values() if streak > 0)  # only these may be skipped
+        return 'decodes: %d / %d, saved: %d (exact %d, backoff %d), correct sentences: %d' % (
+            self.decodes, total, skipped, self.exact_skips, self.backoff_skips, correct)
+
+
+if __name__ == '__main__':
+    sentence_ids = {0: np.array([0, 1]), 1: np.array([2, 3])}
+    scheduler = ActiveScheduler(4, lambda idx: sentence_ids[idx], max_skip=1)
+
+    # first epoch - everything is decoded
+    assert scheduler.need_decode(0, 0) and scheduler.need_decode(1, 0)
+    scheduler.record(0, 0, True, [])
+    scheduler.record(1, 0, False, np.array([2]))
+
+    # sentence 0 untouched -> skipped, sentence 1 was wrong -> decoded
+    assert not scheduler.need_decode(0, 1)
+    assert scheduler.need_decode(1, 1)
+    scheduler.record(1, 1, False, np.array([1]))
+
+    # sentence 0 feature touched -> decoded again
+    assert scheduler.need_decode(0, 2)
+    scheduler.record(0, 2, True, [])
+    assert scheduler.decodes == 4 and scheduler.exact_skips == 1
+
+    # backoff (default) - correct sentence is revisited every 2 ** (streak - 1) epochs
+    scheduler = ActiveScheduler(4, lambda idx: sentence_ids[idx])
+    scheduler.record(0, 0, True, [])
+    scheduler.record(0, 1, True, np.array([0]))
+    assert not scheduler.need_decode(0, 2)
+    assert scheduler.need_decode(0, 3)
+    assert scheduler.backoff_skips == 1
+
+    # state round trip
+    restored = ActiveScheduler(4, lambda idx: sentence_ids[idx], max_skip=4)
+    restored.load_state(scheduler.state())
+    assert restored.report() == scheduler.report()
+    assert not restored.need_decode(0, 2)
+
+    try:
+        ActiveScheduler(4, lambda idx: sentence_ids[idx], max_skip=0)
+        assert False
+    except ValueError:
+        pass
+
+    print('PASSED!')
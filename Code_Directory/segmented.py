@@ -0,0 +1,160 @@
+# !/usr/bin/env python
+from incremental import *
+from budget import *
+import multiprocessing
+
+# a segment may end after punctuation or before a token starting a clause
+BOUNDARY_POS = [',', ':', '.']
+CLAUSE_POS = ['CC', 'WDT', 'WP', 'WRB']
+
+# model shared with the forked segment workers: (w, features, layout, labeler)
+_segment_job = None
+
+
+def is_boundary(sentence, idx):
+    """return True if a segment may start at node 'idx'"""
+    return sentence(idx - 1)[1] in BOUNDARY_POS or sentence(idx)[1] in CLAUSE_POS
+
+
+def segment_bounds(sentence, max_len):
+    """
+    split the words of a sentence into segments of at most 'max_len' words
+    a segment is cut at the last boundary of its second half, or at 'max_len' words if there is none
+    :return: list of [start, end) nodes ranges
+    """
+    if max_len < 1:
+        raise ValueError('segment length must be at least 1, got %r' % max_len)
+    bounds = []
+    start = 1
+    while sentence.sentence_len - start > max_len:
+        end = start + max_len
+        for idx in range(end, start + max_len // 2, -1):
+            if is_boundary(sentence, idx):
+                end = idx
+                break
+        bounds.append((start, end))
+        start = end
+    bounds.append((start, sentence.sentence_len))
+    return bounds
+
+
+def decode_segment(segment):
+    """worker - decode a segment sentence with the shared model, return parents and relation index dictionaries"""
+    w, features, layout, labeler = _segment_job
+    return decode_scored(score_sentence(w, segment, features, layout, labeler))
+
+
+def segment_pool(w, features, layout, labeler, workers):
+    """return process pool decoding segments with the given model"""
+    global _segment_job
+    _segment_job = w, features, layout, labeler
+    return multiprocessing.get_context('fork').Pool(workers)
+
+
+def segmented_decode(w, sentence, features, layout, labeler=None, max_len=40, pool=None, deadline=None):
+    """
+    decode a long sentence by segments, segment heads are attached with an MST over the heads only
+    :param max_len: max words per segment, shorter sentences are decoded whole
+    :param pool: optional segment_pool of the same model, segments are decoded in parallel
+    :param deadline: optional time.perf_counter() time, segments and the top level MST are decoded against it
+                     in process, see budgeted_sentence_decode and budgeted_mst
+    :return: parents dictionary, relation index dictionary (None without labeler),
+             with a deadline a third item, True if any part of the decoding was degraded
+    """
+    global _segment_job
+    bounds = segment_bounds(sentence, max_len)
+    segments = [Sentence([sentence(idx)[0] for idx in range(start, end)],
+                         [sentence(idx)[1] for idx in range(start, end)]) for start, end in bounds]
+    degraded = False
+    if deadline is not None:
+        decoded = [budgeted_sentence_decode(w, segment, features, layout, labeler, deadline) for segment in segments]
+        degraded = any(segment_decoded[2] for segment_decoded in decoded)
+        decoded = [segment_decoded[:2] for segment_decoded in decoded]
+    elif pool is not None:
+        decoded = pool.map(decode_segment, segments)
+    else:
+        _segment_job = w, features, layout, labeler
+        decoded = [decode_segment(segment) for segment in segments]
+
+    # segment parses in sentence positions, segment roots are left for the top level
+    parents, relation_ids, heads = dict(), dict(), []
+    for (start, _), (segment_parents, segment_relations) in zip(bounds, decoded):
+        for m, h in segment_parents.items():
+            if h == 0:
+                heads.append(start + m - 1)
+                continue
+            parents[start + m - 1] = start + h - 1
+            if segment_relations is not None:
+                relation_ids[start + m - 1] = segment_relations[m]
+
+    # top level MST over ROOT and the segment heads, scored in the full sentence
+    nodes = [0] + heads
+    top_heads, top_mods = arcs(len(nodes))
+    rows = arc_rows(sentence.sentence_len)[np.array(nodes)[top_heads], np.array(nodes)[top_mods]]
+    scores, labels = score_arcs(w, sentence, features, layout, labeler, rows)
+    top_scores = np.zeros((len(nodes), len(nodes)), dtype=scores.dtype)
+    top_scores[top_heads, top_mods] = scores
+    top_labels = np.zeros((len(nodes), len(nodes)), dtype=np.int64)
+    if labels is not None:
+        top_labels[top_heads, top_mods] = labels
+    top_parents, top_degraded = budgeted_mst(top_scores, deadline)
+    for m, h in top_parents.items():
+        parents[nodes[m]] = nodes[h]
+        if labeler is not None:
+            relation_ids[nodes[m]] = int(top_labels[h, m])
+    if deadline is not None:
+        return parents, relation_ids if labeler is not None else None, degraded or top_degraded
+    return parents, relation_ids if labeler is not None else None
+
+
+if __name__ == '__main__':
+    from features import *
+
+    vocab_list = ['ofir', 'tomer', 'nadav', 'roy']
+    pos_list = ['S', 'T', ',', 'CC']
+    word_pos_pairs = [('ofir', 'S'), ('tomer', 'S'), ('nadav', 'T'), ('roy', 'T'), (',', ','), ('and', 'CC')]
+    complex = ComplexFeatures(vocab_list, pos_list, word_pos_pairs)
+    labeler = Labeler(['NMOD', 'P', 'ROOT'], window_list(complex))
+    w = np.random.RandomState(0).randint(-5, 5, complex.features_len() + labeler.weights_len())
+    layout = DenseLayout(window_list(complex))
+    words = ['ofir', 'roy', ',', 'tomer', 'nadav', 'and', 'roy', 'ofir', 'tomer', 'nadav', 'roy']
+    tags = ['S', 'T', ',', 'S', 'T', 'CC', 'T', 'S', 'S', 'T', 'T']
+    sentence = Sentence(words, tags)
+
+    # validate segments
+    assert segment_bounds(sentence, 20) == [(1, 12)]
+    assert segment_bounds(sentence, 5) == [(1, 6), (6, 11), (11, 12)]
+    assert segment_bounds(Sentence(['ofir'] * 7, ['S'] * 7), 3) == [(1, 4), (4, 7), (7, 8)]
+    assert segment_bounds(Sentence(['ofir'] * 3, ['S'] * 3), 1) == [(1, 2), (2, 3), (3, 4)]
+    try:
+        segmented_decode(w, sentence, complex, layout, max_len=0)
+        assert False
+    except ValueError:
+        pass
+
+    # validate short sentences decode as a whole
+    assert segmented_decode(w, sentence, complex, layout, labeler, max_len=20) == \
+        labeled_decode(w, sentence_shifts(sentence, complex), layout, sentence.sentence_len, labeler)
+
+    # validate segmented decoding is a tree over all words, in process and in parallel
+    parents, relation_ids = segmented_decode(w, sentence, complex, layout, labeler, max_len=5)
+    assert sorted(parents) == list(range(1, 12)) and sorted(relation_ids) == list(range(1, 12))
+    for m in parents:
+        h, seen = m, set()
+        while h != 0:
+            assert h not in seen
+            seen.add(h)
+            h = parents[h]
+    pool = segment_pool(w, complex, layout, labeler, 2)
+    assert segmented_decode(w, sentence, complex, layout, labeler, max_len=5, pool=pool) == (parents, relation_ids)
+    pool.close()
+    assert segmented_decode(w, sentence, complex, layout, max_len=5)[1] is None
+
+    # validate budgeted segmented decoding
+    assert segmented_decode(w, sentence, complex, layout, labeler, max_len=5, deadline=time.perf_counter() + 60) == \
+        (parents, relation_ids, False)
+    degraded_parents, degraded_relations, degraded = segmented_decode(w, sentence, complex, layout, labeler,
+                                                                      max_len=5, deadline=time.perf_counter())
+    assert degraded and sorted(degraded_parents) == list(range(1, 12)) and sorted(degraded_relations) == sorted(parents)
+
+    print('PASSED!')
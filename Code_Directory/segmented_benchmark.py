@@ -0,0 +1,59 @@
+# !/usr/bin/env python
+from data import *
+from dependency_parser import *
+import argparse
+import time
+
+
+def timed_parses(parser, sentences):
+    """parse sentences one by one, return parses and latencies (seconds) lists"""
+    parses = []
+    latencies = []
+    for sentence in sentences:
+        tokens = [sentence(idx)[0] for idx in range(1, sentence.sentence_len)]
+        tags = [sentence(idx)[1] for idx in range(1, sentence.sentence_len)]
+        start = time.perf_counter()
+        parses.append(parser.parse(tokens, tags))
+        latencies.append(time.perf_counter() - start)
+    return parses, latencies
+
+
+def percentiles(latencies, ps=(50, 90, 99, 100)):
+    """return latency percentiles in milliseconds"""
+    return [float(np.percentile(latencies, p)) * 1000 for p in ps]
+
+
+def uas(sentences, parses):
+    """return accuracy per word of parses"""
+    total = 0
+    correct = 0
+    for sentence, parse in zip(sentences, parses):
+        ground_truth = sentence.dependency_tree()
+        total += len(parse.heads)
+        correct += sum(1 for m, h in enumerate(parse.heads, 1) if ground_truth[m] == h)
+    return correct / total
+
+
+if __name__ == '__main__':
+    """segmented long sentences decoding benchmark - accuracy cost vs latency gain"""
+
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--weights", help="trained weights", required=True)
+    parser.add_argument("--train_data", help="path to the training data of the weights", default='train.labeled')
+    parser.add_argument("--test_data", help="path to test data", default='test.labeled')
+    parser.add_argument("--segment_len", help="max words of a sentence decoded whole", default=40)
+    args = parser.parse_args()
+
+    segment_len = int(args.segment_len)
+    test_data = Data(args.test_data, is_labeled=True)
+    long_sentences = [sentence for sentence in test_data.sentences if sentence.sentence_len - 1 > segment_len]
+    print('%d / %d sentences longer than %d words' % (len(long_sentences), test_data.sentences_num, segment_len))
+
+    whole = Parser.load(args.weights, args.train_data)
+    segmented = Parser.load(args.weights, args.train_data, segment_len=segment_len)
+    for name, model in [('whole', whole), ('segmented', segmented)]:
+        parses, latencies = timed_parses(model, test_data.sentences)
+        long_parses = [parse for sentence, parse in zip(test_data.sentences, parses) if sentence in long_sentences]
+        print('%s: test accuracy: %.4f, long sentences accuracy: %.4f' % (name, uas(test_data.sentences, parses),
+                                                                          uas(long_sentences, long_parses)))
+        print('%s: latency ms p50 %.1f p90 %.1f p99 %.1f max %.1f' % ((name,) + tuple(percentiles(latencies))))
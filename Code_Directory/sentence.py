@@ -17,19 +17,27 @@ class Sentence:
 class LabeledSentence(Sentence):
     """labeled sentence class"""
 
-    def __init__(self, word_list, pos_list, labels_list):
-        """init dependency tree and labels list"""
+    def __init__(self, word_list, pos_list, labels_list, relations_list=None):
+        """init dependency tree, labels list and dependency relations"""
         super(LabeledSentence, self).__init__(word_list, pos_list)
         self._labels_list = labels_list
         self._dt = dict()
+        self._relations = dict()
         for m_1, h in enumerate(self._labels_list):
             m = m_1 + 1
             self._dt[m] = h
+        if relations_list is not None:
+            for m_1, relation in enumerate(relations_list):
+                self._relations[m_1 + 1] = relation
 
     def dependency_tree(self):
         """return dependency tree"""
         return self._dt
 
+    def relations(self):
+        """return dependency relation of every modifier"""
+        return self._relations
+
 
 if __name__ == '__main__':
     word_list = ['ofir', 'tomer', 'nadav', 'roy']
@@ -42,6 +50,8 @@ if __name__ == '__main__':
 
     # validate labaled sentence
     labels_list = [0, 1, 2, 3]
+    l_sen = LabeledSentence(word_list, pos_list, labels_list, ['ROOT', 'NMOD', 'P', 'P'])
+    assert l_sen.relations() == {1: 'ROOT', 2: 'NMOD', 3: 'P', 4: 'P'}
     l_sen = LabeledSentence(word_list, pos_list, labels_list)
     assert l_sen._sentence == [('ROOT', 'ROOT'), ('ofir', 'S'), ('tomer', 'S'), ('nadav', 'T'), ('roy', 'T')]
     assert l_sen.dependency_tree() == {0: [1], 1: [2], 2: [3], 3: [4]}
@@ -0,0 +1,86 @@
+# !/usr/bin/env python
+from data import *
+from perceptron import *
+from features import *
+from corpus import *
+import argparse
+import multiprocessing
+import random
+import time
+
+FEATURES = {'basic': BasicFeatures, 'complex': ComplexFeatures}
+
+# feature stores shared with the forked workers: features type -> (train perceptron, test perceptron)
+_stores = dict()
+
+
+def run_config(config):
+    """train and evaluate a single configuration over the shared feature store"""
+    features_type, N, active, seed = config
+    train_perceptron, test_perceptron = _stores[features_type]
+    random.seed(seed)
+    start = time.time()
+    scheduler = train_perceptron.scheduler() if active else None
+    w = train_perceptron.train(N, scheduler)
+    train_time = time.time() - start
+    start = time.time()
+    train_accuracy = train_perceptron.accuracy(w)
+    test_accuracy = test_perceptron.accuracy(w)
+    eval_time = time.time() - start
+    return features_type, N, train_accuracy, test_accuracy, train_time, eval_time
+
+
+def sweep(configs, workers):
+    """run all configurations, in parallel if workers > 1"""
+    if workers <= 1:
+        return [run_config(config) for config in configs]
+    with multiprocessing.get_context('fork').Pool(workers) as pool:
+        return pool.map(run_config, configs, chunksize=1)
+
+
+def write_summary(file_name, results, extract_times):
+    """write summary table of accuracy and wall time per configuration"""
+    with open(file_name, 'w') as fh:
+        fh.write('features\tN\ttrain_accuracy\ttest_accuracy\textract_time\ttrain_time\teval_time\n')
+        for features_type, N, train_accuracy, test_accuracy, train_time, eval_time in results:
+            fh.write('%s\t%d\t%.4f\t%.4f\t%.1f\t%.1f\t%.1f\n' % (features_type, N, train_accuracy, test_accuracy,
+                                                                 extract_times[features_type], train_time, eval_time))
+
+
+if __name__ == '__main__':
+    """sweep program"""
+
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--features", help="comma separated features types", default='basic,complex')
+    parser.add_argument("--N", help="comma separated numbers of iterations", default='1')
+    parser.add_argument("--active", help="train with the active sentence scheduler", action='store_true')
+    parser.add_argument("--workers", help="number of processes", default=multiprocessing.cpu_count())
+    parser.add_argument("--seed", help="shuffle seed of every configuration", default=0)
+    parser.add_argument("--train_data", help="path to training data", default='train.labeled')
+    parser.add_argument("--test_data", help="path to test data", default='test.labeled')
+    parser.add_argument("--binary", help="load data files from their memory-mapped binary corpus", action='store_true')
+    parser.add_argument("--output", help="summary table path", default='sweep.tsv')
+    args = parser.parse_args()
+
+    features_types = args.features.split(',')
+    train_data = load_data(args.train_data, True, args.binary)
+    test_data = load_data(args.test_data, True, args.binary)
+
+    # extract every feature set once
+    extract_times = dict()
+    for features_type in features_types:
+        start = time.time()
+        print('extract', features_type, 'features')
+        features = FEATURES[features_type](train_data.vocab_list, train_data.pos_list, train_data.word_pos_pairs)
+        _stores[features_type] = (Perceptron(train_data, features, int(args.workers)),
+                                  Perceptron(test_data, features, int(args.workers)))
+        extract_times[features_type] = time.time() - start
+        print('extract ended', extract_times[features_type])
+
+    configs = [(features_type, int(N), args.active, int(args.seed))
+               for features_type in features_types for N in args.N.split(',')]
+    results = sweep(configs, min(int(args.workers), len(configs)))
+    write_summary(args.output, results, extract_times)
+
+    for result in results:
+        print('%s N=%d train accuracy: %.4f test accuracy: %.4f train time: %.1f' % result[:5])
@@ -0,0 +1,231 @@
+# !/usr/bin/env python
+from lexicon import *
+from random import shuffle
+import numpy as np
+
+# arc-standard actions
+SHIFT, LEFT_ARC, RIGHT_ARC = 0, 1, 2
+ACTIONS_NUM = 3
+
+# configuration features are the arc templates of three (head, modifier) slots:
+# (s0, s1) - left arc candidate, (s1, s0) - right arc candidate, (s0, b0) - buffer lookahead
+SLOTS_NUM = 3
+
+
+class ArcStandard:
+    """arc-standard configuration, ROOT starts on the stack"""
+
+    def __init__(self, sentence_len):
+        """init configuration of a sentence with 'sentence_len' nodes (ROOT included)"""
+        self.sentence_len = sentence_len
+        self.stack = [0]
+        self.buffer = 1  # buffer front, the buffer is [buffer, sentence_len)
+        self.parents = dict()
+
+    def done(self):
+        """return True on the terminal configuration"""
+        return self.buffer == self.sentence_len and len(self.stack) == 1
+
+    def legal(self):
+        """return legal actions list"""
+        actions = []
+        if self.buffer < self.sentence_len:
+            actions.append(SHIFT)
+        if len(self.stack) > 2:
+            actions.append(LEFT_ARC)
+        if len(self.stack) > 1:
+            actions.append(RIGHT_ARC)
+        return actions
+
+    def apply(self, action):
+        """apply action to the configuration"""
+        if action == SHIFT:
+            self.stack.append(self.buffer)
+            self.buffer += 1
+        elif action == LEFT_ARC:
+            self.parents[self.stack.pop(-2)] = self.stack[-1]
+        else:
+            m = self.stack.pop()
+            self.parents[m] = self.stack[-1]
+
+    def oracle(self, d_tree, children_num):
+        """
+        static oracle action
+        :param d_tree: gold modifier -> head dictionary
+        :param children_num: number of gold modifiers of every node not attached yet (updated)
+        """
+        if len(self.stack) > 2 and d_tree[self.stack[-2]] == self.stack[-1]:
+            return LEFT_ARC
+        if len(self.stack) > 1 and d_tree[self.stack[-1]] == self.stack[-2] and children_num[self.stack[-1]] == 0:
+            return RIGHT_ARC
+        return SHIFT
+
+
+def config_shifts(state, sentence, features, templates_num):
+    """return (slots * templates) shifts row of a configuration, -1 for a missing slot"""
+    row = np.full(SLOTS_NUM * templates_num, -1, dtype=np.int32)
+    s0 = state.stack[-1]
+    if len(state.stack) > 1:
+        s1 = state.stack[-2]
+        row[:templates_num] = [shift for shift, _ in features(s0, s1, sentence)]
+        row[templates_num:2 * templates_num] = [shift for shift, _ in features(s1, s0, sentence)]
+    if state.buffer < sentence.sentence_len:
+        row[2 * templates_num:] = [shift for shift, _ in features(s0, state.buffer, sentence)]
+    return row
+
+
+def action_scores(w, ids, found):
+    """return scores of all actions, the weight of action a is at base index + a"""
+    base = ids[found]
+    return w[base[:, None] + np.arange(ACTIONS_NUM)].sum(axis=0)
+
+
+def transition_decode(w, index, sentence, features, templates_num):
+    """greedy linear time decoding, return parents dictionary"""
+    state = ArcStandard(sentence.sentence_len)
+    while not state.done():
+        ids, found = index.ids(config_shifts(state, sentence, features, templates_num)[None])
+        scores = action_scores(w, ids[0], found[0])
+        state.apply(max(state.legal(), key=lambda action: scores[action]))
+    return state.parents
+
+
+def oracle_configs(sentence, features, templates_num):
+    """return gold configurations shifts and actions of a sentence, None if its tree isn't projective"""
+    d_tree = sentence.dependency_tree()
+    children_num = [0] * sentence.sentence_len
+    for h in d_tree.values():
+        children_num[h] += 1
+    state = ArcStandard(sentence.sentence_len)
+    rows, actions = [], []
+    while not state.done():
+        action = state.oracle(d_tree, children_num)
+        if action not in state.legal():
+            return None
+        rows.append(config_shifts(state, sentence, features, templates_num))
+        actions.append(action)
+        state.apply(action)
+        if action != SHIFT:
+            children_num[state.stack[-1]] -= 1
+    if state.parents != d_tree:
+        return None
+    return np.array(rows, dtype=np.int32), np.array(actions, dtype=np.int64)
+
+
+class TransitionPerceptron:
+    """arc-standard transition based parser trained with the perceptron over the arc feature templates"""
+
+    def __init__(self, data, features, index, grow_index=False):
+        """
+        init perceptron, extract gold configurations of the projective sentences
+        :param index: FeatureIndex of the configuration features, every feature reserves a weight per action
+        :param grow_index: add the gold configurations features to the index (training data)
+        """
+        self._data = data
+        self._features = features
+        self._index = index
+        self._templates_num = features.features_num()
+        self._configs = []
+        if grow_index:
+            for sentence in data.sentences:
+                configs = oracle_configs(sentence, features, self._templates_num)
+                if configs is not None:
+                    self._configs.append(configs)
+            if not self._configs:
+                raise ValueError('no projective sentence in the training data, nothing to train on')
+            self._index.add(np.concatenate([rows for rows, _ in self._configs]), width=ACTIONS_NUM)
+
+    def weights_len(self):
+        """return weights vector length"""
+        return self._index.size()
+
+    def sentence_inference(self, w, sentence):
+        """inference on a given sentence"""
+        return transition_decode(w, self._index, sentence, self._features, self._templates_num)
+
+    def train(self, N, w=None):
+        """
+        train the model on the gold configurations (non-projective sentences are skipped)
+        :param N: number of iterations
+        :param w: optional weights to continue training from
+        :return w: learnt weights
+        """
+        w = np.zeros(self.weights_len(), dtype=int) if w is None else self._index.grow(w)
+        features = [self._index.ids(rows) for rows, _ in self._configs]
+        indices = [i for i in range(len(self._configs))]
+        for n in range(N):
+            print('iteration', n + 1, '/', N)
+            for idx in indices:
+                ids, found = features[idx]
+                actions = self._configs[idx][1]
+                state = ArcStandard(len(actions) // 2 + 1)
+                for c, gold in enumerate(actions):
+                    scores = action_scores(w, ids[c], found[c])
+                    predicted = max(state.legal(), key=lambda action: scores[action])
+                    if predicted != gold:
+                        base = ids[c][found[c]]
+                        w[base + gold] += 1
+                        w[base + predicted] -= 1
+                    state.apply(gold)
+            shuffle(indices)
+        return w
+
+    def accuracy(self, w):
+        """evaluate model accuracy per word, data must be labeled"""
+        total = 0
+        correct = 0
+        for sentence in self._data.sentences:
+            ground_truth = sentence.dependency_tree()
+            predicted = self.sentence_inference(w, sentence)
+            for x in range(1, sentence.sentence_len):
+                total += 1
+                if predicted[x] == ground_truth[x]:
+                    correct += 1
+        return correct / total
+
+
+if __name__ == '__main__':
+    from features import *
+
+    # validate oracle reproduces a projective tree
+    sentence = LabeledSentence(['ofir', 'roy', 'tomer', 'nadav'], ['S', 'T', 'S', 'T'], [2, 0, 2, 3])
+    vocab_list = ['ofir', 'tomer', 'nadav', 'roy']
+    pos_list = ['S', 'T']
+    word_pos_pairs = [('ofir', 'S'), ('tomer', 'S'), ('nadav', 'T'), ('roy', 'T')]
+    basic = BasicFeatures(vocab_list, pos_list, word_pos_pairs)
+    rows, actions = oracle_configs(sentence, basic, basic.features_num())
+    assert actions.tolist() == [SHIFT, SHIFT, LEFT_ARC, SHIFT, SHIFT, RIGHT_ARC, RIGHT_ARC, RIGHT_ARC]
+    assert rows.shape == (8, SLOTS_NUM * 9) and (rows[0, :18] == -1).all()
+
+    # non-projective trees have no oracle
+    assert oracle_configs(LabeledSentence(['ofir', 'roy', 'tomer', 'nadav'], ['S', 'T', 'S', 'T'], [3, 0, 2, 2]),
+                          basic, basic.features_num()) is None
+
+    # every decoding is a tree covering all words
+    state = ArcStandard(5)
+    while not state.done():
+        state.apply(state.legal()[-1])
+    assert sorted(state.parents) == [1, 2, 3, 4]
+
+    # training data without a projective sentence
+    class NonProjectiveData:
+        sentences = [LabeledSentence(['ofir', 'roy', 'tomer', 'nadav'], ['S', 'T', 'S', 'T'], [3, 0, 2, 2])]
+
+    try:
+        TransitionPerceptron(NonProjectiveData, basic, FeatureIndex(), grow_index=True)
+        assert False
+    except ValueError:
+        pass
+
+    # validate training separates a single sentence
+    class ToyData:
+        sentences = [sentence]
+
+    index = FeatureIndex()
+    perceptron = TransitionPerceptron(ToyData, basic, index, grow_index=True)
+    assert perceptron.weights_len() == len(index) * ACTIONS_NUM
+    w = perceptron.train(5)
+    assert perceptron.sentence_inference(w, sentence) == sentence.dependency_tree()
+    assert perceptron.accuracy(w) == 1
+
+    print('PASSED!')
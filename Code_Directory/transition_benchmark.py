@@ -0,0 +1,62 @@
+# !/usr/bin/env python
+from data import *
+from features import *
+from perceptron import *
+from transition import *
+from dependency_parser import *
+import argparse
+import pickle
+import time
+
+FEATURES = {'basic': BasicFeatures, 'complex': ComplexFeatures}
+
+
+def benchmark(parser, sentences):
+    """parse sentences one by one, return (tokens per second, accuracy per word)"""
+    tokens = 0
+    correct = 0
+    start = time.time()
+    parses = [parser.parse([sentence(idx)[0] for idx in range(1, sentence.sentence_len)],
+                           [sentence(idx)[1] for idx in range(1, sentence.sentence_len)]) for sentence in sentences]
+    elapsed = time.time() - start
+    for sentence, parse in zip(sentences, parses):
+        ground_truth = sentence.dependency_tree()
+        tokens += len(parse.heads)
+        correct += sum(1 for m, h in enumerate(parse.heads, 1) if ground_truth[m] == h)
+    return tokens / elapsed, correct / tokens
+
+
+if __name__ == '__main__':
+    """transition based vs graph based (Digraph.mst) parsing benchmark"""
+
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--features", help="features type basic/complex", default='basic')
+    parser.add_argument("--N", help="number of iterations", default=1)
+    parser.add_argument("--train_data", help="path to training data", default='train.labeled')
+    parser.add_argument("--test_data", help="path to test data", default='test.labeled')
+    parser.add_argument("--save", help="save the transition model, loadable with Parser.load")
+    args = parser.parse_args()
+
+    N = int(args.N)
+    train_data = Data(args.train_data, is_labeled=True)
+    test_data = Data(args.test_data, is_labeled=True)
+    features = FEATURES[args.features](train_data.vocab_list, train_data.pos_list, train_data.word_pos_pairs)
+
+    start = time.time()
+    print('train graph based model')
+    graph_w = Perceptron(train_data, features).train(N)
+    print('training ended', time.time() - start)
+
+    start = time.time()
+    print('train transition based model')
+    index = FeatureIndex()
+    transition_w = TransitionPerceptron(train_data, features, index, grow_index=True).train(N)
+    print('training ended', time.time() - start)
+    if args.save:
+        pickle.dump({'features': features, 'index': index, 'transition': True, 'w': transition_w},
+                    open(args.save, 'wb'))
+
+    for name, model in [('graph (mst)', Parser(features, graph_w)),
+                        ('transition', TransitionParser(features, transition_w, index))]:
+        tokens_per_sec, accuracy = benchmark(model, test_data.sentences)
+        print('%s: %.0f tokens/sec, test accuracy: %.4f' % (name, tokens_per_sec, accuracy))